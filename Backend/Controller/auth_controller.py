@@ -4,25 +4,42 @@
 处理登录、注册、会话管理等API接口
 """
 
-from flask import Blueprint, request, jsonify, session, redirect, url_for
+import time
+from flask import Blueprint, request, session, redirect, url_for
 from functools import wraps
+from typing import Dict, Tuple
 from .user_manager import user_manager
+from .json_utils import ojsonify, raw_jsonify, dumps, json_body
 
 # 创建认证蓝图
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+# 常见错误响应体在导入时预先序列化
+_LOGIN_REQUIRED = dumps({'ok': False, 'error': 'Login required', 'code': 'LOGIN_REQUIRED'})
+_INVALID_SESSION = dumps({'ok': False, 'error': 'Invalid session', 'code': 'INVALID_SESSION'})
+_ADMIN_REQUIRED = dumps({'ok': False, 'error': 'Admin permission required', 'code': 'ADMIN_REQUIRED'})
+_INVALID_JSON = dumps({'ok': False, 'error': 'Invalid JSON data'})
+
+# /users 响应的进程内缓存（管理后台会轮询该接口）: key -> (缓存截止时间, 已序列化的响应体)
+USERS_LIST_CACHE_TTL = 30
+_users_list_cache: Dict[str, Tuple[float, bytes]] = {}
+
+def _invalidate_users_list():
+    """用户增删改后清除 /users 缓存"""
+    _users_list_cache.pop('users_list', None)
+
 def login_required(f):
     """登录验证装饰器"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
         session_token = session.get('session_token')
         if not session_token:
-            return jsonify({'ok': False, 'error': 'Login required', 'code': 'LOGIN_REQUIRED'}), 401
+            return raw_jsonify(_LOGIN_REQUIRED, 401)
 
         user_info = user_manager.validate_session(session_token)
         if not user_info:
             session.pop('session_token', None)
-            return jsonify({'ok': False, 'error': 'Invalid session', 'code': 'INVALID_SESSION'}), 401
+            return raw_jsonify(_INVALID_SESSION, 401)
 
         # 将用户信息添加到request中
         request.current_user = user_info
@@ -37,7 +54,7 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         user_info = request.current_user
         if not user_manager.check_permission(user_info['username'], 'admin'):
-            return jsonify({'ok': False, 'error': 'Admin permission required', 'code': 'ADMIN_REQUIRED'}), 403
+            return raw_jsonify(_ADMIN_REQUIRED, 403)
 
         return f(*args, **kwargs)
 
@@ -47,27 +64,30 @@ def admin_required(f):
 def login():
     """用户登录"""
     try:
-        data = request.get_json()
+        data = json_body()
         if not data:
-            return jsonify({'ok': False, 'error': 'Invalid JSON data'}), 400
+            return raw_jsonify(_INVALID_JSON, 400)
 
         username = data.get('username', '').strip()
         password = data.get('password', '')
 
         if not username or not password:
-            return jsonify({'ok': False, 'error': 'Username and password required'}), 400
+            return ojsonify({'ok': False, 'error': 'Username and password required'}, 400)
 
         # 认证用户
         success, user_info = user_manager.authenticate_user(username, password)
 
         if not success:
-            return jsonify({'ok': False, 'error': 'Invalid username or password'}), 401
+            return ojsonify({'ok': False, 'error': 'Invalid username or password'}, 401)
+
+        # 认证成功时更新了 last_login，/users 缓存随之失效
+        _invalidate_users_list()
 
         # 创建会话
         session_token = user_manager.create_session(username)
         session['session_token'] = session_token
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': 'Login successful',
             'user': user_info,
@@ -75,7 +95,7 @@ def login():
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Login failed: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Login failed: {str(e)}'}, 500)
 
 @auth_bp.route('/logout', methods=['POST'])
 @login_required
@@ -87,19 +107,19 @@ def logout():
             user_manager.logout_user(session_token)
             session.pop('session_token', None)
 
-        return jsonify({'ok': True, 'message': 'Logout successful'})
+        return ojsonify({'ok': True, 'message': 'Logout successful'})
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Logout failed: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Logout failed: {str(e)}'}, 500)
 
 @auth_bp.route('/register', methods=['POST'])
 @admin_required  # 只有管理员可以注册新用户
 def register():
     """用户注册（管理员功能）"""
     try:
-        data = request.get_json()
+        data = json_body()
         if not data:
-            return jsonify({'ok': False, 'error': 'Invalid JSON data'}), 400
+            return raw_jsonify(_INVALID_JSON, 400)
 
         username = data.get('username', '').strip()
         password = data.get('password', '')
@@ -108,10 +128,10 @@ def register():
         display_name = data.get('display_name', '').strip()
 
         if not username or not password:
-            return jsonify({'ok': False, 'error': 'Username and password required'}), 400
+            return ojsonify({'ok': False, 'error': 'Username and password required'}, 400)
 
         if len(password) < 6:
-            return jsonify({'ok': False, 'error': 'Password must be at least 6 characters'}), 400
+            return ojsonify({'ok': False, 'error': 'Password must be at least 6 characters'}, 400)
 
         # 创建用户
         success, message = user_manager.create_user(
@@ -123,12 +143,13 @@ def register():
         )
 
         if not success:
-            return jsonify({'ok': False, 'error': message}), 400
+            return ojsonify({'ok': False, 'error': message}, 400)
 
-        return jsonify({'ok': True, 'message': message})
+        _invalidate_users_list()
+        return ojsonify({'ok': True, 'message': message})
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Registration failed: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Registration failed: {str(e)}'}, 500)
 
 @auth_bp.route('/profile', methods=['GET'])
 @login_required
@@ -136,13 +157,13 @@ def get_profile():
     """获取当前用户信息"""
     try:
         user_info = request.current_user
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'user': user_info
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to get profile: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to get profile: {str(e)}'}, 500)
 
 @auth_bp.route('/check-session', methods=['GET'])
 def check_session():
@@ -150,71 +171,78 @@ def check_session():
     try:
         session_token = session.get('session_token')
         if not session_token:
-            return jsonify({'ok': False, 'logged_in': False, 'error': 'No session'})
+            return ojsonify({'ok': False, 'logged_in': False, 'error': 'No session'})
 
         user_info = user_manager.validate_session(session_token)
         if not user_info:
             session.pop('session_token', None)
-            return jsonify({'ok': False, 'logged_in': False, 'error': 'Invalid session'})
+            return ojsonify({'ok': False, 'logged_in': False, 'error': 'Invalid session'})
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'logged_in': True,
             'user': user_info
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Session check failed: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Session check failed: {str(e)}'}, 500)
 
 @auth_bp.route('/users', methods=['GET'])
 @admin_required
 def list_users():
     """列出所有用户（管理员功能）"""
     try:
+        cached = _users_list_cache.get('users_list')
+        if cached and time.monotonic() < cached[0]:
+            return raw_jsonify(cached[1])
+
         users = user_manager.list_users()
-        return jsonify({
+        body = dumps({
             'ok': True,
             'users': users
         })
+        _users_list_cache['users_list'] = (time.monotonic() + USERS_LIST_CACHE_TTL, body)
+        return raw_jsonify(body)
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to list users: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to list users: {str(e)}'}, 500)
 
 @auth_bp.route('/users/<username>/role', methods=['PUT'])
 @admin_required
 def update_user_role(username):
     """更新用户角色（管理员功能）"""
     try:
-        data = request.get_json()
+        data = json_body()
         if not data:
-            return jsonify({'ok': False, 'error': 'Invalid JSON data'}), 400
+            return raw_jsonify(_INVALID_JSON, 400)
 
         new_role = data.get('role')
         if not new_role:
-            return jsonify({'ok': False, 'error': 'Role required'}), 400
+            return ojsonify({'ok': False, 'error': 'Role required'}, 400)
 
         success, message = user_manager.update_user_role(username, new_role)
 
         if not success:
-            return jsonify({'ok': False, 'error': message}), 400
+            return ojsonify({'ok': False, 'error': message}, 400)
 
-        return jsonify({'ok': True, 'message': message})
+        _invalidate_users_list()
+        return ojsonify({'ok': True, 'message': message})
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to update role: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to update role: {str(e)}'}, 500)
 
 @auth_bp.route('/users/<username>/status', methods=['PUT'])
 @admin_required
 def update_user_status(username):
     """更新用户状态（管理员功能）"""
     try:
-        data = request.get_json()
+        data = json_body()
         if not data:
-            return jsonify({'ok': False, 'error': 'Invalid JSON data'}), 400
+            return raw_jsonify(_INVALID_JSON, 400)
 
         is_active = data.get('is_active')
         if is_active is None:
-            return jsonify({'ok': False, 'error': 'is_active required'}), 400
+            return ojsonify({'ok': False, 'error': 'is_active required'}, 400)
 
         if is_active:
             success, message = user_manager.activate_user(username)
@@ -222,21 +250,22 @@ def update_user_status(username):
             success, message = user_manager.deactivate_user(username)
 
         if not success:
-            return jsonify({'ok': False, 'error': message}), 400
+            return ojsonify({'ok': False, 'error': message}, 400)
 
-        return jsonify({'ok': True, 'message': message})
+        _invalidate_users_list()
+        return ojsonify({'ok': True, 'message': message})
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to update status: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to update status: {str(e)}'}, 500)
 
 @auth_bp.route('/permissions/check', methods=['POST'])
 @login_required
 def check_permissions():
     """检查用户权限"""
     try:
-        data = request.get_json()
+        data = json_body()
         if not data:
-            return jsonify({'ok': False, 'error': 'Invalid JSON data'}), 400
+            return raw_jsonify(_INVALID_JSON, 400)
 
         user_info = request.current_user
         username = user_info['username']
@@ -252,10 +281,10 @@ def check_permissions():
         if sector:
             result['has_sector_access'] = user_manager.check_sector_access(username, sector)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'permissions': result
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Permission check failed: {str(e)}'}), 500
\ No newline at end of file
+        return ojsonify({'ok': False, 'error': f'Permission check failed: {str(e)}'}, 500)
\ No newline at end of file
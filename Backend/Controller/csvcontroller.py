@@ -4,64 +4,119 @@ CSV API 控制器 - 只负责路由和请求处理
 业务逻辑已移至 Backend/Functions 模块
 """
 
-from flask import Blueprint, request, jsonify, current_app, send_from_directory, url_for
+from flask import Blueprint, request, current_app, send_from_directory, url_for
 import os
-from typing import Optional, Tuple
-import json
+import re
+import time
+import uuid
+import threading
+from typing import Optional, Tuple, BinaryIO
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
 
 from werkzeug.utils import secure_filename
 
 # 导入核心功能模块
 from Backend.Functions.csv_processor import csv_processor
 from Backend.Functions.csv_cleaner import csv_cleaner
+from .json_utils import ojsonify, dumps, loads
 
 bp = Blueprint("csv_api", __name__)
 
-# 配置常量
-MAX_BYTES = 100 * 1024 * 1024  # 100MB
-ALLOWED_EXT = {'.csv', '.xls', '.xlsx'}
 
+@bp.record_once
+def _init_upload_dir(state) -> None:
+    """注册蓝图时解析一次上传目录并确保存在，之后各请求直接读取，不再重复拼路径和 makedirs"""
+    app = state.app
+    upload_dir = app.config.get('UPLOAD_FOLDER') or os.path.join(app.root_path, '_uploads')
+    os.makedirs(upload_dir, exist_ok=True)
+    app.extensions['csv_upload_dir'] = upload_dir
+
+
+def _upload_dir() -> str:
+    """当前应用的上传目录（清洗结果、对比报告都写在这里）"""
+    return current_app.extensions['csv_upload_dir']
 
-def _get_file_and_bytes() -> Tuple[Optional[str], Optional[bytes], Optional[Tuple[str, int]]]:
+
+# 配置常量
+MAX_BYTES = 100 * 1024 * 1024  # 100MB
+MULTIPART_OVERHEAD = 1024 * 1024  # 请求体中 multipart 边界、表单字段等额外字节的余量
+ALLOWED_EXT = frozenset(('.csv', '.xls', '.xlsx'))
+STREAM_CLEAN_BYTES = 32 * 1024 * 1024  # 超过该大小且只需逐行清洗的 CSV 按块流式处理
+# api_clean 的 date_format 参数（strftime 写法）到 formatting 日期任务格式的映射
+DATE_FORMAT_ALIASES = {
+    '%Y-%m-%d': 'YYYY-MM-DD',
+    '%Y/%m/%d': 'YYYY-MM-DD',
+    '%d-%m-%y': 'DD_MM_YY',
+    '%d/%m/%y': 'DD_MM_YY',
+    '%m-%y': 'MM-YY',
+    '%m/%y': 'MM-YY'
+}
+
+# 对比接口的两个文件并行解析（pandas C 解析器在分词时释放 GIL）
+_parse_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='csv-parse')
+
+# 对比结果的 xlsx 写出放到子进程中执行（纯 Python 写表，受 GIL 限制），接口立即返回任务 ID
+# 任务状态写在上传目录下的状态文件中（而非进程内存），多个 worker 进程部署时任一进程都能查询
+DIFF_WORKERS = min(4, os.cpu_count() or 1)
+DIFF_JOB_TTL = 3600  # 任务状态文件的保留时间（秒），超过时仍未完成的任务视为已中断
+DIFF_JOB_DIR = '_jobs'
+_JOB_ID_RE = re.compile(r'[0-9a-f]{32}')
+_diff_pool: Optional[ProcessPoolExecutor] = None
+_diff_pool_lock = threading.Lock()
+
+
+def _get_file_and_stream() -> Tuple[Optional[str], Optional[BinaryIO], Optional[Tuple[str, int]]]:
     """
     从请求中提取文件并验证
 
     Returns:
-        Tuple: (filename, binary_data, error)
+        Tuple: (filename, stream, error)
             - filename: 文件名
-            - binary_data: 文件的二进制数据
+            - stream: 上传文件的文件对象（Werkzeug 的临时文件，可 seek），由解析函数直接读取，不整体读入内存
             - error: 错误信息元组 (message, status_code)，无错误时为 None
     """
+    # 先按 Content-Length 拒绝过大的请求，不去解析（落盘）请求体
+    content_length = request.content_length
+    if content_length and content_length > MAX_BYTES + MULTIPART_OVERHEAD:
+        return None, None, ('file too large', 413)
+
     if 'file' not in request.files:
         return None, None, ('no file field', 400)
 
     f = request.files['file']
-    if not f or not f.filename or f.filename.strip() == '':
+    name = f.filename if f else None
+    if not name or name.isspace():
         return None, None, ('empty filename', 400)
 
-    ext = os.path.splitext(f.filename)[1].lower()
+    dot = name.rfind('.')
+    ext = name[dot:].lower() if dot > 0 else ''
     if ext not in ALLOWED_EXT:
         return None, None, ('only .csv/.xls/.xlsx allowed', 400)
 
-    # 检查文件大小
-    f.seek(0, 2)
-    size = f.tell()
-    f.seek(0)
+    # 检查文件大小（seek/tell 只移动指针，不读取内容）
+    f.stream.seek(0, 2)
+    size = f.stream.tell()
+    f.stream.seek(0)
     if size > MAX_BYTES:
         return None, None, ('file too large', 413)
 
-    data = f.read()
-    return f.filename, data, None
+    return f.filename, f.stream, None
 
 def _parse_mapping(default_prefix: str, required: bool = False):
-    raw = request.form.get('mapping') or request.args.get('mapping')
-
-    if raw is None:
-        json_payload = request.get_json(silent=True) or {}
-        raw = json_payload.get('mapping')
+    # JSON 请求体中的 mapping 已由 get_json 解析（并缓存在请求上），直接使用，不再当作字符串二次解析
+    if request.is_json:
+        json_payload = request.get_json(silent=True, cache=True)
+        raw = json_payload.get('mapping') if isinstance(json_payload, dict) else None
+        if raw is None:
+            raw = request.args.get('mapping')
+    else:
+        raw = request.form.get('mapping') or request.args.get('mapping')
 
     if raw in (None, ""):
         if required:
@@ -70,8 +125,8 @@ def _parse_mapping(default_prefix: str, required: bool = False):
 
     if isinstance(raw, str):
         try:
-            mapping = json.loads(raw)
-        except json.JSONDecodeError:
+            mapping = loads(raw)
+        except ValueError:
             return None, ('invalid mapping json', 400)
     else:
         mapping = raw
@@ -79,15 +134,14 @@ def _parse_mapping(default_prefix: str, required: bool = False):
     if not isinstance(mapping, list):
         return None, ('mapping must be a list', 400)
 
-    final = []
-    for idx, item in enumerate(mapping):
+    # 解析结果只在本次请求中使用，直接在原对象上补默认值，不再逐项复制
+    prefix = f"{default_prefix}_"
+    for idx, item in enumerate(mapping, start=1):
         if not isinstance(item, dict):
             return None, ('mapping items must be objects', 400)
-        entry = dict(item)
-        entry.setdefault('out_file', f"{default_prefix}_{idx + 1}.xlsx")
-        final.append(entry)
+        item.setdefault('out_file', f"{prefix}{idx}.xlsx")
 
-    return final, None
+    return mapping, None
 
 
 def _prepare_output_mapping(mapping: list[dict], default_prefix: str):
@@ -98,8 +152,7 @@ def _prepare_output_mapping(mapping: list[dict], default_prefix: str):
     endpoint. Returns a tuple of (prepared_mapping, downloadable_names).
     """
 
-    upload_dir = current_app.config.get('UPLOAD_FOLDER') or os.path.join(current_app.root_path, '_uploads')
-    os.makedirs(upload_dir, exist_ok=True)
+    upload_dir = _upload_dir()
 
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     prepared: list[dict] = []
@@ -122,14 +175,191 @@ def _prepare_output_mapping(mapping: list[dict], default_prefix: str):
 
     return prepared, download_names
 
-def _read_diff_frame(data: bytes, filename: str, sep: Optional[str] = None, encoding: Optional[str] = None):
+def _read_diff_frame(stream: BinaryIO, filename: str, sep: Optional[str] = None, encoding: Optional[str] = None):
     df = csv_processor.read_file_to_dataframe(
-        data,
+        stream,
         filename=filename,
         sep=sep,
-        encoding=encoding
+        encoding=encoding,
+        dtype=str  # 结果会统一转为字符串再逐列转数值，解析时不必推断类型
     )
-    return df.apply(pd.to_numeric, errors='ignore')
+    return _coerce_numeric(df)
+
+
+def _coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    逐列原地转数值，无法整列转换的列保持原样（等价于 apply(pd.to_numeric, errors='ignore')），
+    已是数值类型的列直接跳过，不经过 apply 重建整张表
+    """
+    for i in range(df.shape[1]):
+        column = df.iloc[:, i]
+        if pd.api.types.is_numeric_dtype(column.dtype):
+            continue
+        try:
+            df.isetitem(i, pd.to_numeric(column))
+        except (ValueError, TypeError):
+            pass
+    return df
+
+
+def _read_diff_frames(file1, file2, sep1: Optional[str], sep2: Optional[str],
+                      encoding1: Optional[str], encoding2: Optional[str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """在线程池中同时解析对比的两个文件"""
+    fut1 = _parse_pool.submit(_read_diff_frame, file1.stream, file1.filename, sep=sep1, encoding=encoding1)
+    fut2 = _parse_pool.submit(_read_diff_frame, file2.stream, file2.filename, sep=sep2, encoding=encoding2)
+    return fut1.result(), fut2.result()
+
+
+def _write_diff_job(kind: str, df1: pd.DataFrame, df2: pd.DataFrame, mapping: list[dict]) -> None:
+    """子进程中执行：kind 为 'diff_highlight' 或 'write_diff_report'"""
+    getattr(csv_processor, kind)(df1, df2, mapping)
+
+
+def _diff_job_dir() -> str:
+    """对比任务状态文件所在目录"""
+    job_dir = os.path.join(_upload_dir(), DIFF_JOB_DIR)
+    os.makedirs(job_dir, exist_ok=True)
+    return job_dir
+
+
+def _write_job_status(status_path: str, status: str, error: Optional[str] = None) -> None:
+    """原子写入任务状态文件（先写临时文件再替换，查询方不会读到半个文件）"""
+    payload = dumps({'status': status, 'error': error})
+    tmp_path = f'{status_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, status_path)
+
+
+def _on_diff_job_done(status_path: str, future: Future) -> None:
+    """任务结束（成功、失败或子进程崩溃）时更新状态文件"""
+    if future.cancelled():
+        _write_job_status(status_path, 'failed', 'cancelled')
+        return
+    exc = future.exception()
+    if exc is not None:
+        _write_job_status(status_path, 'failed', str(exc))
+    else:
+        _write_job_status(status_path, 'done')
+
+
+def _prune_job_status(job_dir: str) -> None:
+    """删除超过 DIFF_JOB_TTL 的任务状态文件"""
+    cutoff = time.time() - DIFF_JOB_TTL
+    for entry in os.scandir(job_dir):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def _submit_diff_job(kind: str, df1: pd.DataFrame, df2: pd.DataFrame, mapping: list[dict]) -> str:
+    """提交对比写出任务，返回任务 ID"""
+    global _diff_pool
+
+    job_dir = _diff_job_dir()
+    job_id = uuid.uuid4().hex
+    status_path = os.path.join(job_dir, f'{job_id}.json')
+
+    with _diff_pool_lock:
+        _prune_job_status(job_dir)
+        # 先写 pending，再提交任务，完成回调写入的状态一定在其之后
+        _write_job_status(status_path, 'pending')
+
+        if _diff_pool is None:
+            _diff_pool = ProcessPoolExecutor(max_workers=DIFF_WORKERS)
+        try:
+            future = _diff_pool.submit(_write_diff_job, kind, df1, df2, mapping)
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可再用，重建一次
+            _diff_pool = ProcessPoolExecutor(max_workers=DIFF_WORKERS)
+            future = _diff_pool.submit(_write_diff_job, kind, df1, df2, mapping)
+
+    future.add_done_callback(partial(_on_diff_job_done, status_path))
+    return job_id
+
+
+def _clean_output_path(filename: Optional[str]) -> Tuple[str, str, str]:
+    """生成清洗结果的输出文件，返回 (output_filename, output_path, export_ext)"""
+    upload_dir = _upload_dir()
+
+    base_name = Path(filename).stem if filename else 'cleaned'
+    safe_stem = secure_filename(base_name) or 'cleaned'
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    original_suffix = Path(filename).suffix.lower() if filename else ''
+    export_ext = '.xlsx' if original_suffix in {'.xls', '.xlsx'} else '.csv'
+    output_filename = f"{safe_stem}_cleaned_{timestamp}{export_ext}"
+    return output_filename, os.path.join(upload_dir, output_filename), export_ext
+
+
+def _first_occurrence(seen: dict, row_hash: int, row: tuple) -> bool:
+    """行是否第一次出现：先按 64 位行哈希查找，哈希相同时比较整行，哈希碰撞不会误删不同的行"""
+    rows = seen.get(row_hash)
+    if rows is None:
+        seen[row_hash] = [row]
+        return True
+    if row in rows:
+        return False
+    rows.append(row)
+    return True
+
+
+def _stream_clean(stream: BinaryIO, filename: str, case: str, clean_columns: bool, strip_special: bool,
+                  clean_cells: bool, remove_dups: bool):
+    """
+    大 CSV 的逐块清洗：列名、单元格、去重都只依赖当前行，逐块处理后追加写出，
+    输出与整表读入（按原始文本读取）时一致
+
+    不去重时内存占用只与块大小相关；去重需记住已出现的每个不同的行（行哈希 -> 行内容，
+    哈希相同时再比较整行），这部分内存随不重复行数增长
+    """
+    output_filename, output_path, _ = _clean_output_path(filename)
+
+    applied_steps = []
+    if clean_columns:
+        applied_steps.append('列名标准化')
+        if strip_special:
+            applied_steps.append('移除特殊字符')
+    if clean_cells:
+        applied_steps.append('单元格清洗')
+    if remove_dups:
+        applied_steps.append('重复行去重')
+
+    original_rows = 0
+    cleaned_rows = 0
+    columns: list = []
+    seen: dict = {}
+
+    for i, chunk in enumerate(csv_processor.iter_csv_chunks(stream)):
+        original_rows += len(chunk)
+        if clean_columns:
+            chunk = csv_cleaner.clean_column_name(chunk, case=case, strip_special=strip_special)
+        if clean_cells:
+            chunk = csv_cleaner.clean_cell_values(chunk)
+        if remove_dups:
+            hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy().tolist()
+            rows = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+            keep = np.array([_first_occurrence(seen, h, row) for h, row in zip(hashes, rows)], dtype=bool)
+            chunk = chunk[keep]
+
+        if i == 0:
+            columns = list(chunk.columns)
+            chunk.to_csv(output_path, index=False, encoding='utf-8-sig')
+        else:
+            chunk.to_csv(output_path, index=False, header=False, mode='a', encoding='utf-8')
+        cleaned_rows += len(chunk)
+
+    return ojsonify({
+        'ok': True,
+        'filename': filename,
+        'cleaned_rows': cleaned_rows,
+        'removed_duplicates': original_rows - cleaned_rows if remove_dups else 0,
+        'columns': columns,
+        'applied_steps': applied_steps,
+        'output_filename': output_filename,
+        'download_url': url_for('csv_api.download_cleaned_file', filename=output_filename)
+    })
 
 
 # ==================== API 路由 ====================
@@ -140,9 +370,9 @@ def api_diff_metadata():
     file2 = request.files.get('file2')
 
     if not file1 or not file1.filename:
-        return jsonify({'ok': False, 'error': 'file1 is required'}), 400
+        return ojsonify({'ok': False, 'error': 'file1 is required'}, 400)
     if not file2 or not file2.filename:
-        return jsonify({'ok': False, 'error': 'file2 is required'}), 400
+        return ojsonify({'ok': False, 'error': 'file2 is required'}, 400)
 
     sep1 = request.args.get('sep1') or request.form.get('sep1')
     sep2 = request.args.get('sep2') or request.form.get('sep2')
@@ -150,11 +380,7 @@ def api_diff_metadata():
     encoding2 = request.args.get('encoding2') or request.form.get('encoding2')
 
     try:
-        data1 = file1.read()
-        data2 = file2.read()
-
-        df1 = _read_diff_frame(data1, file1.filename, sep=sep1, encoding=encoding1)
-        df2 = _read_diff_frame(data2, file2.filename, sep=sep2, encoding=encoding2)
+        df1, df2 = _read_diff_frames(file1, file2, sep1, sep2, encoding1, encoding2)
 
         dtypes1 = csv_processor._infer_column_types(df1)
         dtypes2 = csv_processor._infer_column_types(df2)
@@ -170,7 +396,7 @@ def api_diff_metadata():
             if col in numeric1_set and col in numeric2_set
         ]
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'columns1': list(df1.columns),
             'columns2': list(df2.columns),
@@ -179,9 +405,9 @@ def api_diff_metadata():
             'shared_numeric_columns': shared_numeric
         })
     except ImportError as e:
-        return jsonify({'ok': False, 'error': str(e)}), 400
+        return ojsonify({'ok': False, 'error': str(e)}, 400)
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'diff metadata failed: {e}'}), 400
+        return ojsonify({'ok': False, 'error': f'diff metadata failed: {e}'}, 400)
 
 @bp.post("/api/csv/preview")
 def api_preview():
@@ -198,13 +424,13 @@ def api_preview():
             'ok': bool,
             'filename': str,
             'columns': list,
-            'rows': list[dict]
+            'rows': list[list]  # 每行的值按 columns 的顺序排列
         }
     """
-    filename, data, err = _get_file_and_bytes()
+    filename, stream, err = _get_file_and_stream()
     if err:
         msg, code = err
-        return jsonify({'ok': False, 'error': msg}), code
+        return ojsonify({'ok': False, 'error': msg}, code)
 
     # 解析参数
     try:
@@ -219,17 +445,17 @@ def api_preview():
     # 调用核心功能
     try:
         payload = csv_processor.get_preview(
-            data,
+            stream,
             n=n,
             sep=sep,
             filename=filename,
             encoding=encoding
         )
-        return jsonify({'ok': True, 'filename': filename, **payload})
+        return ojsonify({'ok': True, 'filename': filename, **payload})
     except ImportError as e:
-        return jsonify({'ok': False, 'error': str(e)}), 400
+        return ojsonify({'ok': False, 'error': str(e)}, 400)
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'parse failed: {e}'}), 400
+        return ojsonify({'ok': False, 'error': f'parse failed: {e}'}, 400)
 
 
 @bp.post("/api/csv/summary")
@@ -240,6 +466,7 @@ def api_summary():
     Query Parameters:
         sep (str): CSV分隔符，可选
         encoding (str): CSV编码，可选
+        engine (str): CSV解析引擎，arrow 表示用 pyarrow.csv 直读（默认由 FAST_IO 环境变量决定）
 
     Returns:
         JSON: {
@@ -255,26 +482,27 @@ def api_summary():
             }
         }
     """
-    filename, data, err = _get_file_and_bytes()
+    filename, stream, err = _get_file_and_stream()
     if err:
         msg, code = err
-        return jsonify({'ok': False, 'error': msg}), code
+        return ojsonify({'ok': False, 'error': msg}, code)
 
     sep = request.args.get('sep')
     encoding = request.args.get('encoding')
 
     try:
         summary = csv_processor.get_summary(
-            data,
+            stream,
             sep=sep,
             filename=filename,
-            encoding=encoding
+            encoding=encoding,
+            engine=request.args.get('engine')
         )
-        return jsonify({'ok': True, 'filename': filename, 'summary': summary})
+        return ojsonify({'ok': True, 'filename': filename, 'summary': summary})
     except ImportError as e:
-        return jsonify({'ok': False, 'error': str(e)}), 400
+        return ojsonify({'ok': False, 'error': str(e)}, 400)
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'parse failed: {e}'}), 400
+        return ojsonify({'ok': False, 'error': f'parse failed: {e}'}, 400)
 
 
 @bp.post("/api/csv/clean")
@@ -283,6 +511,7 @@ def api_clean():
     清洗CSV数据
 
     Query Parameters:
+        engine (str): CSV解析引擎，arrow 表示用 pyarrow.csv 直读（默认由 FAST_IO 环境变量决定）
         case (str): 列名大小写 ('upper', 'lower', 'title')
         clean_columns (bool): 是否清洗列名
         strip_special (bool): 是否移除列名中的特殊字符
@@ -316,10 +545,10 @@ def api_clean():
             'applied_steps': list[str]
         }
     """
-    filename, data, err = _get_file_and_bytes()
+    filename, stream, err = _get_file_and_stream()
     if err:
         msg, code = err
-        return jsonify({'ok': False, 'error': msg}), code
+        return ojsonify({'ok': False, 'error': msg}, code)
 
     # 解析参数
     case = request.args.get('case', 'upper')
@@ -363,10 +592,25 @@ def api_clean():
     outlier_threshold = _parse_float(request.args.get('outlier_threshold')) or 3.0
     outlier_strategy = request.args.get('outlier_strategy', 'median')
 
+    # 大 CSV 且只做列名/单元格清洗和去重时，按块流式处理，不把整个文件载入内存
+    row_wise_only = not any((normalize_strings, round_decimals, scale_numeric, format_percentages,
+                             format_dates, fill_missing, handle_outliers))
+    row_wise_csv = row_wise_only and Path(filename).suffix.lower() == '.csv'
+    if row_wise_csv:
+        stream.seek(0, 2)
+        size = stream.tell()
+        stream.seek(0)
+        if size >= STREAM_CLEAN_BYTES:
+            try:
+                return _stream_clean(stream, filename, case, clean_columns, strip_special, clean_cells, remove_dups)
+            except Exception as e:
+                return ojsonify({'ok': False, 'error': f'clean failed: {e}'}, 400)
+
     try:
         # 读取数据
-        from Backend.Functions.csv_processor import csv_processor
-        df = csv_processor.read_file_to_dataframe(data, filename=filename)
+        # 只做逐行清洗的 CSV 按原始文本读取（与流式路径相同），输出不随文件大小改变
+        df = csv_processor.read_file_to_dataframe(stream, filename=filename, engine=request.args.get('engine'),
+                                                  dtype=str if row_wise_csv else None)
         original_rows = len(df)
 
         applied_steps = []
@@ -398,6 +642,11 @@ def api_clean():
 
         numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
         string_cols = df.select_dtypes(include=['object', 'string', 'category']).columns.tolist()
+        # 数值列整块转为 float64 矩阵，归一化与百分比判断共用，避免逐列生成中间 Series
+        numeric_arr = None
+        if numeric_cols and len(df) and ((scale_numeric and scale_factor is None and scale_offset is None)
+                                         or format_percentages):
+            numeric_arr = df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
 
         if normalize_strings:
             if add_job('str', string_cols):
@@ -413,48 +662,35 @@ def api_clean():
                 scale_jobs_added |= add_job('scale', numeric_cols, operation='mul', factor=scale_factor)
             if scale_offset is not None:
                 scale_jobs_added |= add_job('scale', numeric_cols, operation='add', factor=scale_offset)
-            if scale_factor is None and scale_offset is None:
-                for col in numeric_cols:
-                    series = pd.to_numeric(df[col], errors='coerce')
-                    valid = series.dropna()
-                    if valid.empty:
-                        continue
-                    span = valid.max() - valid.min()
-                    if span == 0:
-                        continue
-                    formatting_jobs.append(
-                        {'Column': [col], 'trans_type': 'scale', 'operation': 'sub', 'factor': float(valid.min())})
-                    formatting_jobs.append(
-                        {'Column': [col], 'trans_type': 'scale', 'operation': 'div', 'factor': float(span)})
+            if scale_factor is None and scale_offset is None and numeric_arr is not None:
+                # 最小-最大归一化：整块求各列最小值与跨度，生成一个 normalize 任务
+                # fmin/fmax 忽略 NaN，全空列得到 NaN 且不产生警告
+                mins = np.fmin.reduce(numeric_arr, axis=0)
+                spans = np.fmax.reduce(numeric_arr, axis=0) - mins
+                scalable = ~np.isnan(spans) & (spans != 0)
+                scale_cols = [col for col, ok in zip(numeric_cols, scalable) if ok]
+                if scale_cols:
+                    formatting_jobs.append({'Column': scale_cols, 'trans_type': 'normalize',
+                                            'min': mins[scalable].tolist(), 'span': spans[scalable].tolist()})
                     scale_jobs_added = True
             if scale_jobs_added:
                 applied_steps.append('数值缩放/平移')
 
         if format_percentages:
             percent_cols = []
-            for col in numeric_cols:
-                series = pd.to_numeric(df[col], errors='coerce')
-                valid = series.dropna()
-                if valid.empty:
-                    continue
-                if ((valid >= 0) & (valid <= 1)).mean() >= 0.6:
-                    percent_cols.append(col)
+            if numeric_arr is not None:
+                # 非空值中落在 [0, 1] 的比例不低于 60% 视为百分比列（NaN 比较结果为 False）
+                valid_counts = (~np.isnan(numeric_arr)).sum(axis=0)
+                in_range = ((numeric_arr >= 0) & (numeric_arr <= 1)).sum(axis=0)
+                is_percent = (valid_counts > 0) & (in_range / np.maximum(valid_counts, 1) >= 0.6)
+                percent_cols = [col for col, ok in zip(numeric_cols, is_percent) if ok]
             if add_job('percent', percent_cols, decimals=percent_decimals):
                 applied_steps.append('百分比格式化')
 
         if format_dates:
-            def _normalize_date_format(fmt: str) -> str:
-                mapping = {
-                    '%Y-%m-%d': 'YYYY-MM-DD',
-                    '%Y/%m/%d': 'YYYY-MM-DD',
-                    '%d-%m-%y': 'DD_MM_YY',
-                    '%d/%m/%y': 'DD_MM_YY',
-                    '%m-%y': 'MM-YY',
-                    '%m/%y': 'MM-YY'
-                }
-                return mapping.get(fmt, 'YYYY-MM-DD')
-
             date_cols: list[str] = []
+            sample_cols: list[str] = []
+            samples: list[pd.Series] = []
             for col in df.columns:
                 series = df[col]
                 if isinstance(series, pd.DataFrame):
@@ -465,13 +701,17 @@ def api_clean():
                     date_cols.append(col)
                     continue
                 if series.dtype == 'O' or pd.api.types.is_string_dtype(series):
-                    sample = series.dropna().astype(str).head(20)
-                    if sample.empty:
-                        continue
-                    parsed = pd.to_datetime(sample, errors='coerce', utc=False)
-                    if parsed.notna().mean() >= 0.6:
-                        date_cols.append(col)
-            if add_job('date', date_cols, format=_normalize_date_format(date_format)):
+                    sample = series.dropna().head(20).astype(str)
+                    if not sample.empty:
+                        sample_cols.append(col)
+                        samples.append(sample.reset_index(drop=True))
+            if samples:
+                # 各列样本拼接后一次解析，与清洗时的 format='mixed' 保持一致，再按列统计可解析比例
+                stacked = pd.concat(samples, keys=range(len(samples)))
+                parsed = pd.to_datetime(stacked, errors='coerce', format='mixed', utc=False)
+                ratios = parsed.notna().groupby(level=0).mean()
+                date_cols.extend(col for col, ratio in zip(sample_cols, ratios) if ratio >= 0.6)
+            if add_job('date', date_cols, format=DATE_FORMAT_ALIASES.get(date_format, 'YYYY-MM-DD')):
                 applied_steps.append('日期格式化')
 
         if fill_missing:
@@ -519,8 +759,7 @@ def api_clean():
                 applied_steps.append('异常值处理')
 
         if formatting_jobs:
-            df = csv_cleaner.formatting(df, formatting_jobs)
-            df = df.apply(pd.to_numeric, errors='ignore')
+            df = _coerce_numeric(csv_cleaner.formatting(df, formatting_jobs))
 
         removed = 0
 
@@ -531,30 +770,22 @@ def api_clean():
             applied_steps.append('重复行去重')
 
         # 生成导出文件
-        upload_dir = current_app.config.get('UPLOAD_FOLDER') or os.path.join(current_app.root_path, '_uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-
-        base_name = Path(filename).stem if filename else 'cleaned'
-        safe_stem = secure_filename(base_name) or 'cleaned'
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        original_suffix = Path(filename).suffix.lower() if filename else ''
-        export_ext = '.xlsx' if original_suffix in {'.xls', '.xlsx'} else '.csv'
-        output_filename = f"{safe_stem}_cleaned_{timestamp}{export_ext}"
-        output_path = os.path.join(upload_dir, output_filename)
+        output_filename, output_path, export_ext = _clean_output_path(filename)
 
         try:
             if export_ext == '.xlsx':
-                df.to_excel(output_path, index=False)
+                # 按行流式写出（有 xlsxwriter 时用 constant_memory 模式），不在内存中构建整张工作表
+                csv_processor.write_excel(output_path, df)
             else:
                 df.to_csv(output_path, index=False, encoding='utf-8-sig')
         except Exception as export_err:
-            return jsonify({'ok': False, 'error': f'clean succeeded but export failed: {export_err}'}), 500
+            return ojsonify({'ok': False, 'error': f'clean succeeded but export failed: {export_err}'}, 500)
 
         download_url = url_for('csv_api.download_cleaned_file', filename=output_filename)
 
 
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'filename': filename,
             'cleaned_rows': len(df),
@@ -565,18 +796,20 @@ def api_clean():
             'download_url': download_url
         })
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'clean failed: {e}'}), 400
+        return ojsonify({'ok': False, 'error': f'clean failed: {e}'}, 400)
 
 @bp.get("/api/csv/download/<path:filename>")
 def download_cleaned_file(filename: str):
-    upload_dir = current_app.config.get('UPLOAD_FOLDER') or os.path.join(current_app.root_path, '_uploads')
+    upload_dir = _upload_dir()
     safe_name = secure_filename(filename)
     if not safe_name:
-        return jsonify({'ok': False, 'error': 'invalid filename'}), 400
+        return ojsonify({'ok': False, 'error': 'invalid filename'}, 400)
     file_path = os.path.join(upload_dir, safe_name)
     if not os.path.isfile(file_path):
-        return jsonify({'ok': False, 'error': 'file not found'}), 404
-    return send_from_directory(upload_dir, safe_name, as_attachment=True)
+        return ojsonify({'ok': False, 'error': 'file not found'}, 404)
+    # conditional：带 ETag/Last-Modified 并支持 Range，重复下载或断点续传不必重新传输整个文件；
+    # 开启 USE_X_SENDFILE 时由前置的反向代理直接发送文件内容
+    return send_from_directory(upload_dir, safe_name, as_attachment=True, conditional=True)
 
 
 @bp.post("/api/csv/diff_highlight")
@@ -585,14 +818,14 @@ def api_diff_highlight():
     file2 = request.files.get('file2')
 
     if not file1 or not file1.filename:
-        return jsonify({'ok': False, 'error': 'file1 is required'}), 400
+        return ojsonify({'ok': False, 'error': 'file1 is required'}, 400)
     if not file2 or not file2.filename:
-        return jsonify({'ok': False, 'error': 'file2 is required'}), 400
+        return ojsonify({'ok': False, 'error': 'file2 is required'}, 400)
 
     mapping, err = _parse_mapping('diff_highlight', required=True)
     if err:
         msg, code = err
-        return jsonify({'ok': False, 'error': msg}), code
+        return ojsonify({'ok': False, 'error': msg}, code)
 
     sep1 = request.args.get('sep1') or request.form.get('sep1')
     sep2 = request.args.get('sep2') or request.form.get('sep2')
@@ -600,31 +833,34 @@ def api_diff_highlight():
     encoding2 = request.args.get('encoding2') or request.form.get('encoding2')
 
     try:
-        data1 = file1.read()
-        data2 = file2.read()
-
-        df1 = _read_diff_frame(data1, file1.filename, sep=sep1, encoding=encoding1)
-        df2 = _read_diff_frame(data2, file2.filename, sep=sep2, encoding=encoding2)
+        df1, df2 = _read_diff_frames(file1, file2, sep1, sep2, encoding1, encoding2)
 
         if df1.shape != df2.shape:
-            return jsonify({'ok': False, 'error': 'files must have the same shape'}), 400
+            return ojsonify({'ok': False, 'error': 'files must have the same shape'}, 400)
         if list(df1.columns) != list(df2.columns):
-            return jsonify({'ok': False, 'error': 'files must share the same columns'}), 400
+            return ojsonify({'ok': False, 'error': 'files must share the same columns'}, 400)
 
         prepared_mapping, download_names = _prepare_output_mapping(mapping, 'diff_highlight')
 
-        csv_processor.diff_highlight(df1, df2, prepared_mapping)
+        job_id = _submit_diff_job('diff_highlight', df1, df2, prepared_mapping)
 
         download_urls = [
             url_for('csv_api.download_cleaned_file', filename=name)
             for name in download_names
         ]
 
-        return jsonify({'ok': True, 'created_files': download_names, 'download_urls': download_urls})
+        # 文件在后台生成，完成前下载链接不可用，可通过 /api/csv/diff_status/<job_id> 查询
+        return ojsonify({
+            'ok': True,
+            'job_id': job_id,
+            'status': 'pending',
+            'created_files': download_names,
+            'download_urls': download_urls
+        })
     except ImportError as e:
-        return jsonify({'ok': False, 'error': str(e)}), 400
+        return ojsonify({'ok': False, 'error': str(e)}, 400)
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'diff highlight failed: {e}'}), 400
+        return ojsonify({'ok': False, 'error': f'diff highlight failed: {e}'}, 400)
 
 
 @bp.post("/api/csv/diff_report")
@@ -633,14 +869,14 @@ def api_diff_report():
     file2 = request.files.get('file2')
 
     if not file1 or not file1.filename:
-        return jsonify({'ok': False, 'error': 'file1 is required'}), 400
+        return ojsonify({'ok': False, 'error': 'file1 is required'}, 400)
     if not file2 or not file2.filename:
-        return jsonify({'ok': False, 'error': 'file2 is required'}), 400
+        return ojsonify({'ok': False, 'error': 'file2 is required'}, 400)
 
     mapping, err = _parse_mapping('diff_report', required=True)
     if err:
         msg, code = err
-        return jsonify({'ok': False, 'error': msg}), code
+        return ojsonify({'ok': False, 'error': msg}, code)
 
     sep1 = request.args.get('sep1') or request.form.get('sep1')
     sep2 = request.args.get('sep2') or request.form.get('sep2')
@@ -648,28 +884,61 @@ def api_diff_report():
     encoding2 = request.args.get('encoding2') or request.form.get('encoding2')
 
     try:
-        data1 = file1.read()
-        data2 = file2.read()
-
-        df1 = _read_diff_frame(data1, file1.filename, sep=sep1, encoding=encoding1)
-        df2 = _read_diff_frame(data2, file2.filename, sep=sep2, encoding=encoding2)
+        df1, df2 = _read_diff_frames(file1, file2, sep1, sep2, encoding1, encoding2)
 
         if df1.shape != df2.shape:
-            return jsonify({'ok': False, 'error': 'files must have the same shape'}), 400
+            return ojsonify({'ok': False, 'error': 'files must have the same shape'}, 400)
         if list(df1.columns) != list(df2.columns):
-            return jsonify({'ok': False, 'error': 'files must share the same columns'}), 400
+            return ojsonify({'ok': False, 'error': 'files must share the same columns'}, 400)
 
         prepared_mapping, download_names = _prepare_output_mapping(mapping, 'diff_report')
 
-        csv_processor.write_diff_report(df1, df2, prepared_mapping)
+        job_id = _submit_diff_job('write_diff_report', df1, df2, prepared_mapping)
 
         download_urls = [
             url_for('csv_api.download_cleaned_file', filename=name)
             for name in download_names
         ]
 
-        return jsonify({'ok': True, 'created_files': download_names, 'download_urls': download_urls})
+        # 文件在后台生成，完成前下载链接不可用，可通过 /api/csv/diff_status/<job_id> 查询
+        return ojsonify({
+            'ok': True,
+            'job_id': job_id,
+            'status': 'pending',
+            'created_files': download_names,
+            'download_urls': download_urls
+        })
     except ImportError as e:
-        return jsonify({'ok': False, 'error': str(e)}), 400
+        return ojsonify({'ok': False, 'error': str(e)}, 400)
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'diff report failed: {e}'}), 400
\ No newline at end of file
+        return ojsonify({'ok': False, 'error': f'diff report failed: {e}'}, 400)
+
+
+@bp.get("/api/csv/diff_status/<job_id>")
+def api_diff_status(job_id: str):
+    """
+    查询对比写出任务的状态
+
+    Returns:
+        JSON: {'ok': bool, 'job_id': str, 'status': 'pending' | 'done' | 'failed', 'error': str}
+    """
+    if not _JOB_ID_RE.fullmatch(job_id):
+        return ojsonify({'ok': False, 'error': 'job not found'}, 404)
+
+    status_path = os.path.join(_diff_job_dir(), f'{job_id}.json')
+    try:
+        with open(status_path, 'rb') as f:
+            job = loads(f.read())
+        written_at = os.path.getmtime(status_path)
+    except (FileNotFoundError, ValueError):
+        return ojsonify({'ok': False, 'error': 'job not found'}, 404)
+
+    status = job.get('status')
+    if status == 'pending' and time.time() - written_at > DIFF_JOB_TTL:
+        # 提交任务的进程已退出，任务不会再完成
+        status, job['error'] = 'failed', 'job was interrupted'
+
+    if status == 'failed':
+        return ojsonify({'ok': False, 'job_id': job_id, 'status': 'failed', 'error': f"diff failed: {job.get('error')}"}, 400)
+
+    return ojsonify({'ok': True, 'job_id': job_id, 'status': status})
@@ -0,0 +1,101 @@
+# Backend/Controller/json_utils.py
+"""
+JSON 响应工具
+优先使用 orjson 序列化（Rust 实现，比标准库 json 快数倍），未安装时回退到 json
+"""
+
+import json
+from typing import Any
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+# 依赖检查
+_HAS_ORJSON = False
+
+try:
+    import orjson
+    _HAS_ORJSON = True
+except ImportError:
+    pass
+
+
+def _default(obj: Any):
+    """处理 orjson / json 原生不支持的类型"""
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):
+        # numpy 标量 / 数组（标准库 json 回退时使用）
+        return obj.tolist()
+    return str(obj)
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """将对象序列化为 UTF-8 JSON 字节串（numpy 标量/数组、非字符串键可直接序列化；indent=True 时缩进 2 格）"""
+    if _HAS_ORJSON:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    return json.dumps(obj, ensure_ascii=False, default=_default, indent=2 if indent else None).encode('utf-8')
+
+
+def loads(data: Any) -> Any:
+    """解析 JSON 字符串/字节串，格式错误时抛出 ValueError（json.JSONDecodeError）"""
+    if _HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_body() -> Any:
+    """
+    解析请求体 JSON：原始字节只读取一次、不缓存，直接交给 loads
+
+    请求体为空或不是合法 JSON 时返回 None（由调用方按 Invalid JSON data 返回 400）
+    """
+    data = request.get_data(cache=False)
+    if not data:
+        return None
+    try:
+        return loads(data)
+    except ValueError:
+        return None
+
+
+def ojsonify(obj: Any, status: int = 200):
+    """jsonify 的快速替代：直接返回 application/json 响应"""
+    return current_app.response_class(dumps(obj), status=status, mimetype='application/json')
+
+
+def raw_jsonify(body: bytes, status: int = 200):
+    """以预先序列化好的 JSON 字节串构造响应（用于固定内容的常见错误响应）"""
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask 的 JSON provider：让 jsonify / request.get_json 也使用 orjson
+
+    输出与 DefaultJSONProvider 一致（键排序、日期仍按 HTTP 日期格式），未安装 orjson 时完全沿用默认实现
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if not _HAS_ORJSON:
+            return super().dumps(obj, **kwargs)
+        indent = kwargs.pop('indent', None)
+        kwargs.pop('separators', None)
+        if kwargs or indent not in (None, 2):
+            return super().dumps(obj, indent=indent, **kwargs)
+
+        # 日期时间交给 Flask 的 default 处理，保持与默认 provider 相同的格式
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if not _HAS_ORJSON or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
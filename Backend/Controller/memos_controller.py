@@ -4,22 +4,36 @@
 支持按用户隔离的备忘录管理
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
+from functools import wraps
 from .auth_controller import login_required
 from .user_manager import user_manager
+from .json_utils import ojsonify, json_body
+from collections import Counter
 from datetime import datetime
-import uuid
+import heapq
+import secrets
 
 # 创建备忘录蓝图
 memos_bp = Blueprint('memos', __name__, url_prefix='/api/memos')
 
+def with_user(f):
+    """解析当前登录用户（须在 login_required 之后）：用户不存在时返回 404，否则以用户名作为第一个参数调用视图"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        username = request.current_user['username']
+        if not user_manager.user_exists(username):
+            return ojsonify({'ok': False, 'error': 'User not found'}, 404)
+        return f(username, *args, **kwargs)
+
+    return decorated_function
+
 @memos_bp.route('/', methods=['GET'])
 @login_required
-def list_memos():
+@with_user
+def list_memos(username):
     """列出用户备忘录"""
     try:
-        username = request.current_user['username']
-
         # 获取查询参数
         status = request.args.get('status')
         memo_type = request.args.get('type')
@@ -28,12 +42,7 @@ def list_memos():
         offset = int(request.args.get('offset', 0))
 
         # 获取用户备忘录
-        users = user_manager._load_users()
-        if username not in users:
-            return jsonify({'ok': False, 'error': 'User not found'}), 404
-
-        user = users[username]
-        memos = user.get('memos', [])
+        memos = list(user_manager._load_user_memos(username).values())
 
         # 过滤条件
         if status:
@@ -43,52 +52,44 @@ def list_memos():
         if priority:
             memos = [memo for memo in memos if memo.get('priority') == priority]
 
-        # 按创建时间倒序排序
-        memos.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-
-        # 分页
+        # 按创建时间倒序排序并分页：只需当前页时用 nlargest 部分排序（与完整排序后切片结果一致）
         total_count = len(memos)
-        memos = memos[offset:offset + limit]
+        if offset >= 0 and limit >= 0:
+            memos = heapq.nlargest(offset + limit, memos, key=lambda x: x.get('created_at', ''))[offset:]
+        else:
+            memos = sorted(memos, key=lambda x: x.get('created_at', ''), reverse=True)[offset:offset + limit]
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'memos': memos,
             'total_count': total_count
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to list memos: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to list memos: {str(e)}'}, 500)
 
 @memos_bp.route('/', methods=['POST'])
 @login_required
-def create_memo():
+@with_user
+def create_memo(username):
     """创建备忘录"""
     try:
-        username = request.current_user['username']
-        data = request.get_json()
+        data = json_body()
 
         if not data:
-            return jsonify({'ok': False, 'error': 'Invalid JSON data'}), 400
+            return ojsonify({'ok': False, 'error': 'Invalid JSON data'}, 400)
 
         content = data.get('content', '').strip()
         if not content:
-            return jsonify({'ok': False, 'error': 'Content is required'}), 400
+            return ojsonify({'ok': False, 'error': 'Content is required'}, 400)
 
         memo_type = data.get('type', 'general')
         tags = data.get('tags', [])
         priority = data.get('priority', 'normal')
 
-        # 获取用户数据
-        users = user_manager._load_users()
-        if username not in users:
-            return jsonify({'ok': False, 'error': 'User not found'}), 404
-
-        user = users[username]
-        if 'memos' not in user:
-            user['memos'] = []
-
         # 生成备忘录ID
-        memo_id = str(uuid.uuid4())
+        memo_id = secrets.token_hex(16)
+        now = datetime.now().isoformat()
 
         # 创建备忘录
         memo = {
@@ -98,161 +99,131 @@ def create_memo():
             'tags': tags,
             'priority': priority,
             'status': 'active',
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat(),
+            'created_at': now,
+            'updated_at': now,
             'due_date': data.get('due_date'),
             'completed_at': None
         }
 
-        user['memos'].append(memo)
-        user_manager._save_users(users)
+        with user_manager._memos_locked(username):
+            memos = user_manager._load_user_memos(username)
+            memos[memo_id] = memo
+            user_manager._save_user_memos(username, memos)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': 'Memo created successfully',
             'memo_id': memo_id
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to create memo: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to create memo: {str(e)}'}, 500)
 
 @memos_bp.route('/<memo_id>', methods=['GET'])
 @login_required
-def get_memo(memo_id):
+@with_user
+def get_memo(username, memo_id):
     """获取指定备忘录"""
     try:
-        username = request.current_user['username']
-
-        users = user_manager._load_users()
-        if username not in users:
-            return jsonify({'ok': False, 'error': 'User not found'}), 404
-
-        user = users[username]
-        memos = user.get('memos', [])
-
-        memo = next((memo for memo in memos if memo['id'] == memo_id), None)
+        memos = user_manager._load_user_memos(username)
+        memo = memos.get(memo_id)
         if not memo:
-            return jsonify({'ok': False, 'error': 'Memo not found'}), 404
+            return ojsonify({'ok': False, 'error': 'Memo not found'}, 404)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'memo': memo
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to get memo: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to get memo: {str(e)}'}, 500)
 
 @memos_bp.route('/<memo_id>', methods=['PUT'])
 @login_required
-def update_memo(memo_id):
+@with_user
+def update_memo(username, memo_id):
     """更新备忘录"""
     try:
-        username = request.current_user['username']
-        data = request.get_json()
+        data = json_body()
 
         if not data:
-            return jsonify({'ok': False, 'error': 'Invalid JSON data'}), 400
-
-        users = user_manager._load_users()
-        if username not in users:
-            return jsonify({'ok': False, 'error': 'User not found'}), 404
-
-        user = users[username]
-        memos = user.get('memos', [])
-
-        memo = next((memo for memo in memos if memo['id'] == memo_id), None)
-        if not memo:
-            return jsonify({'ok': False, 'error': 'Memo not found'}), 404
-
-        # 更新字段
-        if 'content' in data:
-            memo['content'] = data['content']
-        if 'status' in data:
-            memo['status'] = data['status']
-            if data['status'] == 'completed' and memo.get('completed_at') is None:
-                memo['completed_at'] = datetime.now().isoformat()
-        if 'priority' in data:
-            memo['priority'] = data['priority']
-        if 'tags' in data:
-            memo['tags'] = data['tags']
-        if 'due_date' in data:
-            memo['due_date'] = data['due_date']
-
-        memo['updated_at'] = datetime.now().isoformat()
-
-        user_manager._save_users(users)
-
-        return jsonify({
+            return ojsonify({'ok': False, 'error': 'Invalid JSON data'}, 400)
+
+        with user_manager._memos_locked(username):
+            memos = user_manager._load_user_memos(username)
+            memo = memos.get(memo_id)
+            if not memo:
+                return ojsonify({'ok': False, 'error': 'Memo not found'}, 404)
+
+            now = datetime.now().isoformat()
+
+            # 更新字段
+            if 'content' in data:
+                memo['content'] = data['content']
+            if 'status' in data:
+                memo['status'] = data['status']
+                if data['status'] == 'completed' and memo.get('completed_at') is None:
+                    memo['completed_at'] = now
+            if 'priority' in data:
+                memo['priority'] = data['priority']
+            if 'tags' in data:
+                memo['tags'] = data['tags']
+            if 'due_date' in data:
+                memo['due_date'] = data['due_date']
+
+            memo['updated_at'] = now
+
+            user_manager._save_user_memos(username, memos)
+
+        return ojsonify({
             'ok': True,
             'message': 'Memo updated successfully'
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to update memo: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to update memo: {str(e)}'}, 500)
 
 @memos_bp.route('/<memo_id>', methods=['DELETE'])
 @login_required
-def delete_memo(memo_id):
+@with_user
+def delete_memo(username, memo_id):
     """删除备忘录"""
     try:
-        username = request.current_user['username']
-
-        users = user_manager._load_users()
-        if username not in users:
-            return jsonify({'ok': False, 'error': 'User not found'}), 404
+        with user_manager._memos_locked(username):
+            memos = user_manager._load_user_memos(username)
+            if memos.pop(memo_id, None) is None:
+                return ojsonify({'ok': False, 'error': 'Memo not found'}, 404)
 
-        user = users[username]
-        memos = user.get('memos', [])
+            user_manager._save_user_memos(username, memos)
 
-        memo_index = next((i for i, memo in enumerate(memos) if memo['id'] == memo_id), None)
-        if memo_index is None:
-            return jsonify({'ok': False, 'error': 'Memo not found'}), 404
-
-        del memos[memo_index]
-        user_manager._save_users(users)
-
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': 'Memo deleted successfully'
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to delete memo: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to delete memo: {str(e)}'}, 500)
 
 @memos_bp.route('/statistics', methods=['GET'])
 @login_required
-def get_memo_statistics():
+@with_user
+def get_memo_statistics(username):
     """获取备忘录统计信息"""
     try:
-        username = request.current_user['username']
-
-        users = user_manager._load_users()
-        if username not in users:
-            return jsonify({'ok': False, 'error': 'User not found'}), 404
+        memos = user_manager._load_user_memos(username).values()
 
-        user = users[username]
-        memos = user.get('memos', [])
-
-        # 统计信息
+        # 统计信息（一次遍历）
         total_memos = len(memos)
-        status_stats = {}
-        priority_stats = {}
-        type_stats = {}
+        status_stats = Counter()
+        priority_stats = Counter()
+        type_stats = Counter()
 
         for memo in memos:
-            # 按状态统计
-            status = memo.get('status', 'active')
-            status_stats[status] = status_stats.get(status, 0) + 1
-
-            # 按优先级统计
-            priority = memo.get('priority', 'normal')
-            priority_stats[priority] = priority_stats.get(priority, 0) + 1
+            status_stats[memo.get('status', 'active')] += 1
+            priority_stats[memo.get('priority', 'normal')] += 1
+            type_stats[memo.get('type', 'general')] += 1
 
-            # 按类型统计
-            memo_type = memo.get('type', 'general')
-            type_stats[memo_type] = type_stats.get(memo_type, 0) + 1
-
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'statistics': {
                 'total_memos': total_memos,
@@ -263,36 +234,31 @@ def get_memo_statistics():
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to get statistics: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to get statistics: {str(e)}'}, 500)
 
 @memos_bp.route('/<memo_id>/complete', methods=['POST'])
 @login_required
-def complete_memo(memo_id):
+@with_user
+def complete_memo(username, memo_id):
     """标记备忘录为完成"""
     try:
-        username = request.current_user['username']
-
-        users = user_manager._load_users()
-        if username not in users:
-            return jsonify({'ok': False, 'error': 'User not found'}), 404
-
-        user = users[username]
-        memos = user.get('memos', [])
-
-        memo = next((memo for memo in memos if memo['id'] == memo_id), None)
-        if not memo:
-            return jsonify({'ok': False, 'error': 'Memo not found'}), 404
+        with user_manager._memos_locked(username):
+            memos = user_manager._load_user_memos(username)
+            memo = memos.get(memo_id)
+            if not memo:
+                return ojsonify({'ok': False, 'error': 'Memo not found'}, 404)
 
-        memo['status'] = 'completed'
-        memo['completed_at'] = datetime.now().isoformat()
-        memo['updated_at'] = datetime.now().isoformat()
+            now = datetime.now().isoformat()
+            memo['status'] = 'completed'
+            memo['completed_at'] = now
+            memo['updated_at'] = now
 
-        user_manager._save_users(users)
+            user_manager._save_user_memos(username, memos)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': 'Memo marked as completed'
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to complete memo: {str(e)}'}), 500
\ No newline at end of file
+        return ojsonify({'ok': False, 'error': f'Failed to complete memo: {str(e)}'}, 500)
\ No newline at end of file
@@ -4,9 +4,10 @@
 处理笔记和日记相关的API接口
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
 from .auth_controller import login_required
 from .notes_manager import notes_manager
+from .json_utils import ojsonify, json_body
 
 # 创建笔记蓝图
 notes_bp = Blueprint('notes', __name__, url_prefix='/api/notes')
@@ -43,13 +44,13 @@ def list_notes():
             offset=offset
         )
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             **result
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to list notes: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to list notes: {str(e)}'}, 500)
 
 @notes_bp.route('/', methods=['POST'])
 @login_required
@@ -57,10 +58,10 @@ def create_note():
     """创建新笔记"""
     try:
         username = request.current_user['username']
-        data = request.get_json()
+        data = json_body()
 
         if not data:
-            return jsonify({'ok': False, 'error': 'Invalid JSON data'}), 400
+            return ojsonify({'ok': False, 'error': 'Invalid JSON data'}, 400)
 
         title = data.get('title', '').strip()
         content = data.get('content', '')
@@ -68,7 +69,7 @@ def create_note():
         tags = data.get('tags', [])
 
         if not title:
-            return jsonify({'ok': False, 'error': 'Title is required'}), 400
+            return ojsonify({'ok': False, 'error': 'Title is required'}, 400)
 
         success, message, note_id = notes_manager.create_note(
             username=username,
@@ -79,16 +80,16 @@ def create_note():
         )
 
         if not success:
-            return jsonify({'ok': False, 'error': message}), 400
+            return ojsonify({'ok': False, 'error': message}, 400)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': message,
             'note_id': note_id
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to create note: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to create note: {str(e)}'}, 500)
 
 @notes_bp.route('/<note_id>', methods=['GET'])
 @login_required
@@ -99,15 +100,15 @@ def get_note(note_id):
         note = notes_manager.get_note(username, note_id)
 
         if not note:
-            return jsonify({'ok': False, 'error': 'Note not found'}), 404
+            return ojsonify({'ok': False, 'error': 'Note not found'}, 404)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'note': note
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to get note: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to get note: {str(e)}'}, 500)
 
 @notes_bp.route('/<note_id>', methods=['PUT'])
 @login_required
@@ -115,10 +116,10 @@ def update_note(note_id):
     """更新笔记"""
     try:
         username = request.current_user['username']
-        data = request.get_json()
+        data = json_body()
 
         if not data:
-            return jsonify({'ok': False, 'error': 'Invalid JSON data'}), 400
+            return ojsonify({'ok': False, 'error': 'Invalid JSON data'}, 400)
 
         title = data.get('title')
         content = data.get('content')
@@ -135,15 +136,15 @@ def update_note(note_id):
         )
 
         if not success:
-            return jsonify({'ok': False, 'error': message}), 400
+            return ojsonify({'ok': False, 'error': message}, 400)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': message
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to update note: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to update note: {str(e)}'}, 500)
 
 @notes_bp.route('/<note_id>', methods=['DELETE'])
 @login_required
@@ -155,15 +156,15 @@ def delete_note(note_id):
         success, message = notes_manager.delete_note(username, note_id)
 
         if not success:
-            return jsonify({'ok': False, 'error': message}), 400
+            return ojsonify({'ok': False, 'error': message}, 400)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': message
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to delete note: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to delete note: {str(e)}'}, 500)
 
 @notes_bp.route('/<note_id>/favorite', methods=['POST'])
 @login_required
@@ -175,16 +176,16 @@ def toggle_favorite(note_id):
         success, message, is_favorite = notes_manager.toggle_favorite(username, note_id)
 
         if not success:
-            return jsonify({'ok': False, 'error': message}), 400
+            return ojsonify({'ok': False, 'error': message}, 400)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': message,
             'is_favorite': is_favorite
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to toggle favorite: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to toggle favorite: {str(e)}'}, 500)
 
 @notes_bp.route('/<note_id>/archive', methods=['POST'])
 @login_required
@@ -196,16 +197,16 @@ def toggle_archive(note_id):
         success, message, is_archived = notes_manager.toggle_archive(username, note_id)
 
         if not success:
-            return jsonify({'ok': False, 'error': message}), 400
+            return ojsonify({'ok': False, 'error': message}, 400)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': message,
             'is_archived': is_archived
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to toggle archive: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to toggle archive: {str(e)}'}, 500)
 
 @notes_bp.route('/categories', methods=['GET'])
 @login_required
@@ -215,13 +216,13 @@ def get_categories():
         username = request.current_user['username']
         result = notes_manager.list_notes(username, limit=0)  # 只获取分类信息
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'categories': result['categories']
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to get categories: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to get categories: {str(e)}'}, 500)
 
 @notes_bp.route('/categories', methods=['POST'])
 @login_required
@@ -229,28 +230,28 @@ def add_category():
     """添加新分类"""
     try:
         username = request.current_user['username']
-        data = request.get_json()
+        data = json_body()
 
         if not data:
-            return jsonify({'ok': False, 'error': 'Invalid JSON data'}), 400
+            return ojsonify({'ok': False, 'error': 'Invalid JSON data'}, 400)
 
         category = data.get('category', '').strip()
 
         if not category:
-            return jsonify({'ok': False, 'error': 'Category name is required'}), 400
+            return ojsonify({'ok': False, 'error': 'Category name is required'}, 400)
 
         success, message = notes_manager.add_category(username, category)
 
         if not success:
-            return jsonify({'ok': False, 'error': message}), 400
+            return ojsonify({'ok': False, 'error': message}, 400)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': message
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to add category: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to add category: {str(e)}'}, 500)
 
 @notes_bp.route('/categories/<category>', methods=['DELETE'])
 @login_required
@@ -262,15 +263,15 @@ def remove_category(category):
         success, message = notes_manager.remove_category(username, category)
 
         if not success:
-            return jsonify({'ok': False, 'error': message}), 400
+            return ojsonify({'ok': False, 'error': message}, 400)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'message': message
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to remove category: {str(e)}'}), 500
+        return ojsonify({'ok': False, 'error': f'Failed to remove category: {str(e)}'}, 500)
 
 @notes_bp.route('/statistics', methods=['GET'])
 @login_required
@@ -280,10 +281,10 @@ def get_statistics():
         username = request.current_user['username']
         stats = notes_manager.get_statistics(username)
 
-        return jsonify({
+        return ojsonify({
             'ok': True,
             'statistics': stats
         })
 
     except Exception as e:
-        return jsonify({'ok': False, 'error': f'Failed to get statistics: {str(e)}'}), 500
\ No newline at end of file
+        return ojsonify({'ok': False, 'error': f'Failed to get statistics: {str(e)}'}, 500)
\ No newline at end of file
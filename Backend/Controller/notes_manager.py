@@ -4,11 +4,171 @@
 每个用户拥有独立的笔记空间，完全私密
 """
 
-import json
 import os
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
-import uuid
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import wraps
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+import secrets
+
+from .json_utils import dumps, loads
+
+# 操作日志超过该大小时合并进快照文件
+NOTES_LOG_COMPACT_BYTES = 1 << 20  # 1MB
+# 进程内缓存已解析笔记数据的用户数上限
+NOTES_CACHE_USERS = 64
+
+
+def _synchronized(method):
+    """修改笔记的方法串行执行：读取缓存、修改、写日志作为一个整体"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# 分类不可哈希（无法建索引）时的占位
+_UNINDEXED = object()
+
+
+def _hashable(value) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _NotesIndex:
+    """
+    单个用户笔记的内存二级索引：分类、标签、收藏、归档 -> 笔记ID集合，以及按更新时间排好序的笔记列表
+
+    list_notes 先对这些集合求交集，再按时间顺序只取出当前页的笔记；
+    get_statistics 直接读取集合大小与字数合计，不再遍历笔记；
+    修改笔记时由调用方通过 put / remove 增量维护
+    """
+
+    def __init__(self, notes: Dict[str, Dict]):
+        self.by_category: Dict[object, set] = {}
+        self.by_tag: Dict[object, set] = {}
+        self.favorites: set = set()
+        self.archived: set = set()
+        self.active: set = set()
+        # tags 不是列表的笔记（无法按元素建索引），查询时逐条按原条件判断
+        self.loose_tags: set = set()
+        # note_id -> 加入顺序，与 notes 字典的插入顺序一致，用于更新时间相同时保持原有先后
+        self.seq: Dict[str, int] = {}
+        self._next_seq = 0
+        # 按 (updated_at, -加入顺序, note_id) 升序排列，倒序遍历即为列表页的展示顺序
+        self.recency: List[tuple] = []
+        self.total_words = 0
+        # note_id -> (小写标题, 小写正文)，首次搜索到该笔记时生成，笔记修改后失效
+        self._lowered: Dict[str, tuple] = {}
+        # note_id -> 建索引时的 (分类, 标签, 排序键, 字数)，移除时据此清理
+        self._keys: Dict[str, tuple] = {}
+        for note in notes.values():
+            self.recency.append(self._link(note))
+        self.recency.sort()
+
+    def put(self, note: Dict):
+        """加入或刷新一条笔记的索引（笔记原地修改后调用）"""
+        if note['id'] in self.seq:
+            self._unlink(note['id'])
+        insort(self.recency, self._link(note))
+
+    def remove(self, note_id: str):
+        """删除一条笔记的索引"""
+        if note_id in self.seq:
+            self._unlink(note_id)
+            del self.seq[note_id]
+
+    def matches(self, note: Dict, query: str) -> bool:
+        """标题或正文（忽略大小写）是否包含 query（query 须已转为小写）"""
+        lowered = self._lowered.get(note['id'])
+        if lowered is None:
+            lowered = self._lowered[note['id']] = (note['title'].lower(), note['content'].lower())
+        return query in lowered[0] or query in lowered[1]
+
+    def updated_since(self, timestamp: str) -> int:
+        """updated_at 不早于 timestamp（isoformat 字符串）的笔记数"""
+        return len(self.recency) - bisect_left(self.recency, (timestamp,))
+
+    def newest_first(self, candidates: set, needed: int) -> Iterator[str]:
+        """
+        按更新时间从新到旧迭代 candidates 中的笔记ID
+
+        needed 为预计取出的条数：候选集合足够大时沿 recency 倒序扫描、取够即停，
+        否则直接对候选集合排序
+        """
+        if not candidates:
+            return iter(())
+        if needed * len(self.recency) <= len(candidates) ** 2:
+            return (key[2] for key in reversed(self.recency) if key[2] in candidates)
+        return (key[2] for key in sorted((self._keys[note_id][2] for note_id in candidates), reverse=True))
+
+    def _link(self, note: Dict) -> tuple:
+        """把笔记加入各个集合，返回其排序键（调用方负责放入 recency）"""
+        note_id = note['id']
+        if note_id not in self.seq:
+            self.seq[note_id] = self._next_seq
+            self._next_seq += 1
+
+        category = note.get('category')
+        if _hashable(category):
+            self.by_category.setdefault(category, set()).add(note_id)
+        else:
+            category = _UNINDEXED
+
+        tags = note.get('tags')
+        if isinstance(tags, list):
+            tags = tuple({tag for tag in tags if _hashable(tag)})
+            for tag in tags:
+                self.by_tag.setdefault(tag, set()).add(note_id)
+        else:
+            tags = ()
+            self.loose_tags.add(note_id)
+
+        if note.get('is_favorite', False):
+            self.favorites.add(note_id)
+        if note.get('is_archived', False):
+            self.archived.add(note_id)
+        else:
+            self.active.add(note_id)
+
+        word_count = note.get('word_count', 0)
+        self.total_words += word_count
+
+        sort_key = (note.get('updated_at', ''), -self.seq[note_id], note_id)
+        self._keys[note_id] = (category, tags, sort_key, word_count)
+        return sort_key
+
+    def _unlink(self, note_id: str):
+        category, tags, sort_key, word_count = self._keys.pop(note_id)
+        self.total_words -= word_count
+        self._lowered.pop(note_id, None)
+        if category is not _UNINDEXED:
+            self._discard(self.by_category, category, note_id)
+        for tag in tags:
+            self._discard(self.by_tag, tag, note_id)
+        self.loose_tags.discard(note_id)
+        self.favorites.discard(note_id)
+        self.archived.discard(note_id)
+        self.active.discard(note_id)
+        del self.recency[bisect_left(self.recency, sort_key)]
+
+    @staticmethod
+    def _discard(index: Dict[object, set], key, note_id: str):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(note_id)
+            if not ids:
+                del index[key]
+
 
 class NotesManager:
     """笔记管理类"""
@@ -18,6 +178,15 @@ class NotesManager:
         self.data_dir = data_dir
         self.notes_dir = os.path.join(data_dir, "notes")
 
+        # 已解析的笔记数据: username -> (快照与日志文件的 (mtime_ns, size), 笔记数据, 二级索引)
+        # 文件未变化时直接复用，不再重复解析 JSON
+        self._cache: "OrderedDict[str, Tuple[tuple, Dict, _NotesIndex]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+        # 日志过大时由后台线程合并快照（写出完整文件并 fsync），请求线程只追加日志
+        self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notes-compact')
+        self._compacting: set = set()
+
         # 确保笔记目录存在
         os.makedirs(self.notes_dir, exist_ok=True)
 
@@ -25,14 +194,71 @@ class NotesManager:
         """获取用户笔记文件路径"""
         return os.path.join(self.notes_dir, f"{username}_notes.json")
 
+    def _get_user_log_file(self, username: str) -> str:
+        """获取用户笔记操作日志路径（快照之后的增量修改，每行一条 JSON 记录）"""
+        return os.path.join(self.notes_dir, f"{username}_notes.log")
+
+    def _files_stamp(self, username: str) -> tuple:
+        """快照与日志文件的 (mtime_ns, size)，用于判断缓存是否仍然有效"""
+        stamp = []
+        for path in (self._get_user_notes_file(username), self._get_user_log_file(username)):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _remember(self, username: str, notes_data: Dict):
+        """
+        写入后按新的文件状态更新缓存（超过 NOTES_CACHE_USERS 时淘汰最久未用的用户）
+
+        notes_data 是缓存中的同一份数据时沿用已增量维护的索引，否则重建
+        """
+        with self._lock:
+            cached = self._cache.get(username)
+            if cached is not None and cached[1] is notes_data:
+                index = cached[2]
+            else:
+                index = _NotesIndex(notes_data['notes'])
+            self._cache[username] = (self._files_stamp(username), notes_data, index)
+            self._cache.move_to_end(username)
+            while len(self._cache) > NOTES_CACHE_USERS:
+                self._cache.popitem(last=False)
+
+    def _forget(self, username: str):
+        """修改中途失败时丢弃缓存，下次从文件重新加载"""
+        with self._lock:
+            self._cache.pop(username, None)
+
     def _load_user_notes(self, username: str) -> Dict:
-        """加载用户笔记数据"""
+        """
+        加载用户笔记数据，文件未变化时返回缓存中的同一份数据
+
+        返回的数据与缓存共享，只有持有 self._lock 的修改方法可以原地修改
+        """
+        return self._load_user_state(username)[0]
+
+    def _load_user_state(self, username: str) -> Tuple[Dict, _NotesIndex]:
+        """加载用户笔记数据及其二级索引（修改笔记后须同步调用索引的 put / remove）"""
+        with self._lock:
+            cached = self._cache.get(username)
+            if cached is not None and cached[0] == self._files_stamp(username):
+                self._cache.move_to_end(username)
+                return cached[1], cached[2]
+
+            notes_data = self._read_user_notes(username)
+            self._remember(username, notes_data)
+            return notes_data, self._cache[username][2]
+
+    def _read_user_notes(self, username: str) -> Dict:
+        """从文件读取用户笔记数据：读取快照后按顺序重放操作日志"""
         notes_file = self._get_user_notes_file(username)
         try:
-            with open(notes_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {
+            with open(notes_file, 'rb') as f:
+                notes_data = loads(f.read())
+        except (FileNotFoundError, ValueError):
+            notes_data = {
                 'notes': {},
                 'categories': ['日记', '工作笔记', '想法记录', '待办事项'],
                 'settings': {
@@ -42,20 +268,107 @@ class NotesManager:
                 }
             }
 
+        try:
+            with open(self._get_user_log_file(username), 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        op = loads(line)
+                    except ValueError:
+                        # 写入中途崩溃留下的不完整记录，跳过
+                        continue
+                    self._apply_op(notes_data, op)
+        except FileNotFoundError:
+            pass
+
+        return notes_data
+
+    @staticmethod
+    def _apply_op(notes_data: Dict, op: Dict):
+        """将一条操作记录应用到笔记数据（记录均为幂等操作，重复重放结果不变）"""
+        kind = op.get('op')
+        if kind == 'upsert':
+            note = op['note']
+            notes_data['notes'][note['id']] = note
+        elif kind == 'delete':
+            notes_data['notes'].pop(op['id'], None)
+        elif kind == 'categories':
+            notes_data['categories'] = op['categories']
+
+    def _append_ops(self, username: str, notes_data: Dict, *ops: Dict):
+        """
+        记录一次修改：只向操作日志追加本次变更，不重写整个笔记文件
+
+        notes_data 须已应用这些变更；快照尚不存在或日志超过 NOTES_LOG_COMPACT_BYTES 时
+        直接写出完整快照并清空日志
+        """
+        if not os.path.exists(self._get_user_notes_file(username)):
+            self._compact(username, notes_data)
+        else:
+            # 每条记录以换行开头：即使上次写入中途崩溃留下半行，新记录也会从新的一行开始
+            payload = b''.join(b'\n' + dumps(op) for op in ops)
+            with open(self._get_user_log_file(username), 'ab') as f:
+                f.write(payload)
+                log_size = f.tell()
+
+            if log_size > NOTES_LOG_COMPACT_BYTES:
+                self._schedule_compact(username)
+
+        self._remember(username, notes_data)
+
+    def _schedule_compact(self, username: str):
+        """把快照合并交给后台线程（同一用户排队中时不重复提交）"""
+        with self._lock:
+            if username not in self._compacting:
+                self._compacting.add(username)
+                self._compactor.submit(self._compact_in_background, username)
+
+    def _compact_in_background(self, username: str):
+        """后台合并：按当前缓存中的数据写出快照，期间修改方法等待锁"""
+        with self._lock:
+            self._compacting.discard(username)
+            try:
+                notes_data = self._load_user_notes(username)
+                self._compact(username, notes_data)
+                self._remember(username, notes_data)
+            except Exception:
+                # 合并失败时操作日志仍完整保留，数据不丢失；下次超过阈值时重试
+                self._forget(username)
+
+    def flush(self):
+        """等待已排队的快照合并全部完成（解释器退出时线程池也会等待队列清空）"""
+        self._compactor.submit(lambda: None).result()
+
+    def _compact(self, username: str, notes_data: Dict):
+        """写出完整快照并删除已合并的操作日志"""
+        self._save_user_notes(username, notes_data)
+        try:
+            os.remove(self._get_user_log_file(username))
+        except FileNotFoundError:
+            pass
+
     def _save_user_notes(self, username: str, notes_data: Dict):
-        """保存用户笔记数据"""
+        """保存用户笔记数据（先写临时文件并落盘再替换，中途崩溃不会留下半个文件）"""
         notes_file = self._get_user_notes_file(username)
-        with open(notes_file, 'w', encoding='utf-8') as f:
-            json.dump(notes_data, f, ensure_ascii=False, indent=2)
-
+        tmp_file = notes_file + '.tmp'
+        data = dumps(notes_data)
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, notes_file)
+
+    @_synchronized
     def create_note(self, username: str, title: str, content: str = "",
                    category: str = "日记", tags: List[str] = None) -> Tuple[bool, str, Optional[str]]:
         """创建新笔记"""
         try:
-            notes_data = self._load_user_notes(username)
+            notes_data, index = self._load_user_state(username)
 
             # 生成唯一ID
-            note_id = str(uuid.uuid4())
+            note_id = secrets.token_hex(16)
+            now = datetime.now().isoformat()
 
             # 创建笔记对象
             note = {
@@ -64,8 +377,8 @@ class NotesManager:
                 'content': content,
                 'category': category,
                 'tags': tags or [],
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat(),
+                'created_at': now,
+                'updated_at': now,
                 'word_count': len(content),
                 'is_favorite': False,
                 'is_archived': False
@@ -73,29 +386,35 @@ class NotesManager:
 
             # 保存笔记
             notes_data['notes'][note_id] = note
+            index.put(note)
+            ops = [{'op': 'upsert', 'note': note}]
 
             # 如果分类不存在，添加到分类列表
             if category not in notes_data['categories']:
                 notes_data['categories'].append(category)
+                ops.append({'op': 'categories', 'categories': notes_data['categories']})
 
-            self._save_user_notes(username, notes_data)
+            self._append_ops(username, notes_data, *ops)
 
             return True, "Note created successfully", note_id
 
         except Exception as e:
+            self._forget(username)
             return False, f"Failed to create note: {str(e)}", None
 
+    @_synchronized
     def update_note(self, username: str, note_id: str, title: str = None,
                    content: str = None, category: str = None,
                    tags: List[str] = None) -> Tuple[bool, str]:
         """更新笔记"""
         try:
-            notes_data = self._load_user_notes(username)
+            notes_data, index = self._load_user_state(username)
 
             if note_id not in notes_data['notes']:
                 return False, "Note not found"
 
             note = notes_data['notes'][note_id]
+            ops = [{'op': 'upsert', 'note': note}]
 
             # 更新字段
             if title is not None:
@@ -108,32 +427,38 @@ class NotesManager:
                 # 如果分类不存在，添加到分类列表
                 if category not in notes_data['categories']:
                     notes_data['categories'].append(category)
+                    ops.append({'op': 'categories', 'categories': notes_data['categories']})
             if tags is not None:
                 note['tags'] = tags
 
             note['updated_at'] = datetime.now().isoformat()
+            index.put(note)
 
-            self._save_user_notes(username, notes_data)
+            self._append_ops(username, notes_data, *ops)
 
             return True, "Note updated successfully"
 
         except Exception as e:
+            self._forget(username)
             return False, f"Failed to update note: {str(e)}"
 
+    @_synchronized
     def delete_note(self, username: str, note_id: str) -> Tuple[bool, str]:
         """删除笔记"""
         try:
-            notes_data = self._load_user_notes(username)
+            notes_data, index = self._load_user_state(username)
 
             if note_id not in notes_data['notes']:
                 return False, "Note not found"
 
             del notes_data['notes'][note_id]
-            self._save_user_notes(username, notes_data)
+            index.remove(note_id)
+            self._append_ops(username, notes_data, {'op': 'delete', 'id': note_id})
 
             return True, "Note deleted successfully"
 
         except Exception as e:
+            self._forget(username)
             return False, f"Failed to delete note: {str(e)}"
 
     def get_note(self, username: str, note_id: str) -> Optional[Dict]:
@@ -150,33 +475,48 @@ class NotesManager:
                   limit: int = 50, offset: int = 0) -> Dict:
         """列出用户笔记"""
         try:
-            notes_data = self._load_user_notes(username)
-            notes = list(notes_data['notes'].values())
+            with self._lock:
+                notes_data, index = self._load_user_state(username)
+                all_notes = notes_data['notes']
+
+                # 过滤条件：先用索引求交集，只取出命中的笔记
+                candidates = index.archived if is_archived else index.active
+
+                if category:
+                    candidates = candidates & index.by_category.get(category, set())
 
-            # 过滤条件
-            if category:
-                notes = [note for note in notes if note['category'] == category]
+                if tags:
+                    tagged = set(index.loose_tags)
+                    for tag in tags:
+                        tagged |= index.by_tag.get(tag, set())
+                    candidates = candidates & tagged
 
-            if search_query:
-                query = search_query.lower()
-                notes = [note for note in notes
-                        if query in note['title'].lower() or query in note['content'].lower()]
+                if is_favorite is not None:
+                    candidates = (candidates & index.favorites) if is_favorite else (candidates - index.favorites)
 
-            if tags:
-                notes = [note for note in notes
-                        if any(tag in note['tags'] for tag in tags)]
+                # 只有搜索等需要逐条判断的条件时才取出全部候选，否则总数即候选数，只取当前页
+                per_note = bool(search_query) or bool(tags and index.loose_tags)
+                paged = offset >= 0 and limit >= 0 and not per_note
+                ordered = index.newest_first(candidates, offset + limit if paged else len(candidates))
 
-            if is_favorite is not None:
-                notes = [note for note in notes if note.get('is_favorite', False) == is_favorite]
+                if paged:
+                    total_count = len(candidates)
+                    notes = [all_notes[note_id] for note_id in islice(ordered, offset, offset + limit)]
+                else:
+                    notes = [all_notes[note_id] for note_id in ordered]
 
-            notes = [note for note in notes if note.get('is_archived', False) == is_archived]
+                    if tags and index.loose_tags:
+                        notes = [note for note in notes
+                                if note['id'] not in index.loose_tags or any(tag in note['tags'] for tag in tags)]
 
-            # 按更新时间排序（最新的在前）
-            notes.sort(key=lambda x: x['updated_at'], reverse=True)
+                    if search_query:
+                        query = search_query.lower()
+                        notes = [note for note in notes if index.matches(note, query)]
 
-            # 分页
-            total_count = len(notes)
-            notes = notes[offset:offset + limit]
+            if not paged:
+                # 分页
+                total_count = len(notes)
+                notes = notes[offset:offset + limit]
 
             return {
                 'notes': notes,
@@ -194,10 +534,11 @@ class NotesManager:
                 'error': str(e)
             }
 
+    @_synchronized
     def toggle_favorite(self, username: str, note_id: str) -> Tuple[bool, str, bool]:
         """切换笔记收藏状态"""
         try:
-            notes_data = self._load_user_notes(username)
+            notes_data, index = self._load_user_state(username)
 
             if note_id not in notes_data['notes']:
                 return False, "Note not found", False
@@ -205,18 +546,21 @@ class NotesManager:
             note = notes_data['notes'][note_id]
             note['is_favorite'] = not note.get('is_favorite', False)
             note['updated_at'] = datetime.now().isoformat()
+            index.put(note)
 
-            self._save_user_notes(username, notes_data)
+            self._append_ops(username, notes_data, {'op': 'upsert', 'note': note})
 
             return True, "Favorite status updated", note['is_favorite']
 
         except Exception as e:
+            self._forget(username)
             return False, f"Failed to update favorite: {str(e)}", False
 
+    @_synchronized
     def toggle_archive(self, username: str, note_id: str) -> Tuple[bool, str, bool]:
         """切换笔记归档状态"""
         try:
-            notes_data = self._load_user_notes(username)
+            notes_data, index = self._load_user_state(username)
 
             if note_id not in notes_data['notes']:
                 return False, "Note not found", False
@@ -224,14 +568,17 @@ class NotesManager:
             note = notes_data['notes'][note_id]
             note['is_archived'] = not note.get('is_archived', False)
             note['updated_at'] = datetime.now().isoformat()
+            index.put(note)
 
-            self._save_user_notes(username, notes_data)
+            self._append_ops(username, notes_data, {'op': 'upsert', 'note': note})
 
             return True, "Archive status updated", note['is_archived']
 
         except Exception as e:
+            self._forget(username)
             return False, f"Failed to update archive: {str(e)}", False
 
+    @_synchronized
     def add_category(self, username: str, category: str) -> Tuple[bool, str]:
         """添加新分类"""
         try:
@@ -245,61 +592,53 @@ class NotesManager:
                 return False, "Category already exists"
 
             notes_data['categories'].append(category)
-            self._save_user_notes(username, notes_data)
+            self._append_ops(username, notes_data, {'op': 'categories', 'categories': notes_data['categories']})
 
             return True, f"Category '{category}' added successfully"
 
         except Exception as e:
+            self._forget(username)
             return False, f"Failed to add category: {str(e)}"
 
+    @_synchronized
     def remove_category(self, username: str, category: str) -> Tuple[bool, str]:
         """删除分类"""
         try:
-            notes_data = self._load_user_notes(username)
+            notes_data, index = self._load_user_state(username)
 
             if category not in notes_data['categories']:
                 return False, "Category not found"
 
             # 检查是否有笔记使用这个分类
-            notes_using_category = [note for note in notes_data['notes'].values()
-                                  if note['category'] == category]
+            notes_using_category = index.by_category.get(category, ()) if _hashable(category) else ()
 
             if notes_using_category:
                 return False, f"Cannot delete category: {len(notes_using_category)} notes are using it"
 
             notes_data['categories'].remove(category)
-            self._save_user_notes(username, notes_data)
+            self._append_ops(username, notes_data, {'op': 'categories', 'categories': notes_data['categories']})
 
             return True, f"Category '{category}' removed successfully"
 
         except Exception as e:
+            self._forget(username)
             return False, f"Failed to remove category: {str(e)}"
 
     def get_statistics(self, username: str) -> Dict:
         """获取用户笔记统计信息"""
         try:
-            notes_data = self._load_user_notes(username)
-            notes = list(notes_data['notes'].values())
-
-            # 基础统计
-            total_notes = len(notes)
-            total_words = sum(note['word_count'] for note in notes)
-            favorites_count = len([note for note in notes if note.get('is_favorite', False)])
-            archived_count = len([note for note in notes if note.get('is_archived', False)])
-
-            # 按分类统计
-            category_stats = {}
-            for note in notes:
-                category = note['category']
-                if category not in category_stats:
-                    category_stats[category] = 0
-                category_stats[category] += 1
-
-            # 最近活动（最近7天）
-            from datetime import datetime, timedelta
-            week_ago = datetime.now() - timedelta(days=7)
-            recent_notes = [note for note in notes
-                          if datetime.fromisoformat(note['updated_at']) >= week_ago]
+            with self._lock:
+                notes_data, index = self._load_user_state(username)
+
+                # 计数直接取自二级索引：收藏/归档/分类集合的大小、增量维护的字数合计，
+                # 最近活动在按更新时间排序的列表上二分查找（isoformat 字符串按字典序即按时间）
+                week_ago = (datetime.now() - timedelta(days=7)).isoformat()
+                total_notes = len(notes_data['notes'])
+                total_words = index.total_words
+                favorites_count = len(index.favorites)
+                archived_count = len(index.archived)
+                category_stats = {category: len(ids) for category, ids in index.by_category.items()}
+                recent_count = index.updated_since(week_ago)
 
             return {
                 'total_notes': total_notes,
@@ -308,7 +647,7 @@ class NotesManager:
                 'archived_count': archived_count,
                 'active_notes': total_notes - archived_count,
                 'category_stats': category_stats,
-                'recent_activity': len(recent_notes),
+                'recent_activity': recent_count,
                 'average_words_per_note': total_words // total_notes if total_notes > 0 else 0
             }
 
@@ -5,14 +5,80 @@
 支持文件存储（可轻松迁移到数据库）
 """
 
-import json
+import hmac
 import os
+import threading
+import time
 import hashlib
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from functools import wraps
 from typing import Dict, List, Optional, Tuple
-# 简化版本 - 不使用密码加密
-# from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash
 import secrets
+import tempfile
+
+from .json_utils import dumps, loads
+
+# 依赖检查
+_HAS_BCRYPT = False
+
+try:
+    import bcrypt
+    _HAS_BCRYPT = True
+except ImportError:
+    pass
+
+# 会话验证结果的进程内缓存时长（秒）
+SESSION_CACHE_TTL = 60
+# 会话验证缓存的条目上限（超过后淘汰最久未用的会话）
+SESSION_CACHE_SIZE = 1024
+# 创建会话时清理过期会话的最小间隔（秒）
+SESSION_CLEANUP_INTERVAL = 300
+# 用户角色（权限检查用）的进程内缓存时长（秒）
+PERMISSION_CACHE_TTL = 60
+# bcrypt 的计算成本（2^12 轮，单次校验约 0.2 秒；登录后由会话缓存承担后续请求）
+BCRYPT_ROUNDS = 12
+
+
+def _hash_password(password: str) -> str:
+    """生成带盐的密码哈希：优先 bcrypt，未安装时回退到 werkzeug（scrypt/pbkdf2）"""
+    if _HAS_BCRYPT:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('ascii')
+    return generate_password_hash(password)
+
+
+def _verify_password(password: str, password_hash: str) -> bool:
+    """
+    校验密码哈希（常数时间比较）；哈希格式无法识别时一律校验失败
+
+    Raises:
+        RuntimeError: 存在 bcrypt 哈希但当前环境未安装 bcrypt（配置错误）
+    """
+    if password_hash.startswith('$2'):
+        if not _HAS_BCRYPT:
+            raise RuntimeError('bcrypt password hash found but bcrypt is not installed')
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('ascii'))
+        except ValueError:
+            return False
+    if password_hash.count('$') < 2:
+        return False
+    try:
+        return check_password_hash(password_hash, password)
+    except (ValueError, TypeError):
+        return False
+
+
+def _synchronized(method):
+    """读取/修改用户与会话数据的方法串行执行（缓存中的数据在线程间共享）"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class UserManager:
     """用户管理类"""
@@ -57,16 +123,35 @@ class UserManager:
         }
     }
 
+    # 权限/sector 检查用的集合（O(1) 查找）；USER_ROLES 中仍保留列表，供模板与 JSON 响应按原顺序输出
+    _ROLE_PERMISSIONS = {role: frozenset(info['permissions']) for role, info in USER_ROLES.items()}
+    _ROLE_SECTORS = {role: frozenset(info['sectors']) for role, info in USER_ROLES.items()}
+
     def __init__(self, data_dir: str = "_data"):
         """初始化用户管理器"""
         self.data_dir = data_dir
         self.users_file = os.path.join(data_dir, "users.json")
         self.sessions_file = os.path.join(data_dir, "sessions.json")
         self.notes_dir = os.path.join(data_dir, "notes")
+        self.memos_dir = os.path.join(data_dir, "memos")
+
+        # 会话验证缓存（LRU）: token -> (缓存截止时间, 用户信息)
+        self._session_cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        # 权限检查缓存: username -> (缓存截止时间, 角色)
+        self._role_cache: Dict[str, Tuple[float, Optional[str]]] = {}
+        # 已解析的 users.json / sessions.json: 路径 -> (文件 (mtime_ns, size), 数据)
+        # 文件未变化时直接复用，修改后随写入一起更新，不再每次请求都读取并解析文件
+        self._file_cache: Dict[str, Tuple[tuple, Dict]] = {}
+        # 上次清理过期会话的时间（time.monotonic()）
+        self._last_session_cleanup = float('-inf')
+        self._lock = threading.RLock()
+        # 每个用户的备忘录读-改-写锁: username -> Lock
+        self._memo_locks: Dict[str, threading.Lock] = {}
 
         # 确保数据目录存在
         os.makedirs(data_dir, exist_ok=True)
         os.makedirs(self.notes_dir, exist_ok=True)
+        os.makedirs(self.memos_dir, exist_ok=True)
 
         # 初始化用户和会话数据
         self._init_data_files()
@@ -74,17 +159,18 @@ class UserManager:
         # 创建默认管理员账户
         self._create_default_admin()
 
+        # 旧版内嵌在 users.json 中的备忘录拆分到每个用户独立的文件
+        self._migrate_memos()
+
     def _init_data_files(self):
         """初始化数据文件"""
         # 初始化用户文件
         if not os.path.exists(self.users_file):
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump({}, f, ensure_ascii=False, indent=2)
+            self._write_json(self.users_file, {})
 
         # 初始化会话文件
         if not os.path.exists(self.sessions_file):
-            with open(self.sessions_file, 'w', encoding='utf-8') as f:
-                json.dump({}, f, ensure_ascii=False, indent=2)
+            self._write_json(self.sessions_file, {}, indent=False)
 
     def _create_default_admin(self):
         """创建默认用户账户"""
@@ -94,14 +180,13 @@ class UserManager:
         if 'horizon' not in users:
             horizon_user = {
                 'username': 'horizon',
-                'password': 'horizon',  # 明文密码
+                'password_hash': _hash_password('horizon'),
                 'role': 'horizon',
                 'email': 'horizon@horisation.com',
                 'display_name': 'Horizon Administrator',
                 'created_at': datetime.now().isoformat(),
                 'last_login': None,
-                'is_active': True,
-                'memos': []  # 备忘录数据
+                'is_active': True
             }
             users['horizon'] = horizon_user
             print("✅ Created admin user: horizon/horizon")
@@ -110,14 +195,13 @@ class UserManager:
         if 'fanfan0315' not in users:
             fanfan_user = {
                 'username': 'fanfan0315',
-                'password': 'yyf',  # 明文密码
+                'password_hash': _hash_password('yyf'),
                 'role': 'vip1',
                 'email': 'fanfan0315@horisation.com',
                 'display_name': 'Fanfan0315',
                 'created_at': datetime.now().isoformat(),
                 'last_login': None,
-                'is_active': True,
-                'memos': []  # 备忘录数据
+                'is_active': True
             }
             users['fanfan0315'] = fanfan_user
             print("✅ Created user: fanfan0315/yyf")
@@ -126,31 +210,138 @@ class UserManager:
         if 'horizon' in users or 'fanfan0315' in users:
             self._save_users(users)
 
+    @staticmethod
+    def _file_stamp(path: str) -> Optional[tuple]:
+        """文件的 (mtime_ns, size)，用于判断缓存是否仍然有效"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load_cached(self, path: str) -> Dict:
+        """
+        加载 JSON 数据文件，文件未变化时返回缓存中的同一份数据
+
+        返回的数据与缓存共享，只有持有 self._lock 的方法可以原地修改（修改后须保存）
+        """
+        with self._lock:
+            stamp = self._file_stamp(path)
+            cached = self._file_cache.get(path)
+            if cached is not None and stamp is not None and cached[0] == stamp:
+                return cached[1]
+
+            try:
+                with open(path, 'rb') as f:
+                    data = loads(f.read())
+            except (FileNotFoundError, ValueError):
+                self._file_cache.pop(path, None)
+                return {}
+
+            self._file_cache[path] = (stamp, data)
+            return data
+
+    @contextmanager
+    def _writing(self, path: str, data: Dict):
+        """写入数据文件：成功后缓存更新为写入后的文件状态，失败时丢弃缓存，下次从文件重新加载"""
+        with self._lock:
+            try:
+                yield
+            except BaseException:
+                self._file_cache.pop(path, None)
+                raise
+            self._file_cache[path] = (self._file_stamp(path), data)
+
     def _load_users(self) -> Dict:
         """加载用户数据"""
-        try:
-            with open(self.users_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        return self._load_cached(self.users_file)
 
     def _save_users(self, users: Dict):
         """保存用户数据"""
-        with open(self.users_file, 'w', encoding='utf-8') as f:
-            json.dump(users, f, ensure_ascii=False, indent=2)
+        with self._writing(self.users_file, users):
+            self._write_json(self.users_file, users)
+
+    @staticmethod
+    def _write_json(path: str, data, indent: bool = True, sync: bool = True) -> None:
+        """
+        先完整写入临时文件，再原子替换，中途崩溃不会截断原文件
+
+        sync=True 时替换前先落盘（fsync）；indent=False 时写入紧凑格式
+        """
+        payload = dumps(data, indent=indent)
+        # 临时文件名唯一，并发写入同一文件时不会互相覆盖或替换掉对方的临时文件
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_file, path)
+        except BaseException:
+            try:
+                os.remove(tmp_file)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _get_user_memos_file(self, username: str) -> str:
+        """获取用户备忘录文件路径"""
+        return os.path.join(self.memos_dir, f"{username}_memos.json")
+
+    def _load_user_memos(self, username: str) -> Dict[str, Dict]:
+        """加载用户备忘录: memo_id -> 备忘录（按创建先后排列）"""
+        try:
+            with open(self._get_user_memos_file(username), 'rb') as f:
+                return loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @contextmanager
+    def _memos_locked(self, username: str):
+        """在同一把（按用户区分的）锁内完成备忘录的加载、修改与保存，并发请求不会丢失更新"""
+        with self._lock:
+            lock = self._memo_locks.setdefault(username, threading.Lock())
+        with lock:
+            yield
+
+    def _save_user_memos(self, username: str, memos: Dict[str, Dict]):
+        """保存用户备忘录（每个用户单独一个文件，修改备忘录不再重写整个 users.json）"""
+        self._write_json(self._get_user_memos_file(username), memos)
+
+    def _migrate_memos(self):
+        """把旧版 users.json 中每个用户的 memos 字段移到该用户的备忘录文件"""
+        users = self._load_users()
+        embedded = [username for username, user in users.items() if 'memos' in user]
+        if not embedded:
+            return
+
+        for username in embedded:
+            memos = users[username]['memos']
+            if not isinstance(memos, dict):
+                # 更早的列表格式
+                memos = {memo['id']: memo for memo in memos or []}
+            if memos:
+                # 已有备忘录文件时按 id 合并（id 相同时以文件中的为准）
+                memos.update(self._load_user_memos(username))
+                self._save_user_memos(username, memos)
+            # 备忘录写入文件后才从用户记录中移除
+            del users[username]['memos']
+
+        self._save_users(users)
 
     def _load_sessions(self) -> Dict:
         """加载会话数据"""
-        try:
-            with open(self.sessions_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        return self._load_cached(self.sessions_file)
 
     def _save_sessions(self, sessions: Dict):
-        """保存会话数据"""
-        with open(self.sessions_file, 'w', encoding='utf-8') as f:
-            json.dump(sessions, f, ensure_ascii=False, indent=2)
+        """
+        保存会话数据
+
+        登录、登出都会重写该文件：不缩进、不 fsync，只保留原子替换（会话可丢失，最坏情况是重新登录）
+        """
+        with self._writing(self.sessions_file, sessions):
+            self._write_json(self.sessions_file, sessions, indent=False, sync=False)
 
     def create_user(self, username: str, password: str, role: str,
                    email: str = "", display_name: str = "") -> Tuple[bool, str]:
@@ -158,6 +349,15 @@ class UserManager:
         if role not in self.USER_ROLES:
             return False, f"Invalid role: {role}"
 
+        # 哈希计算较慢，在加锁前完成，不阻塞其他请求
+        password_hash = _hash_password(password)
+
+        with self._lock:
+            return self._add_user(username, password_hash, role, email, display_name)
+
+    def _add_user(self, username: str, password_hash: str, role: str,
+                  email: str, display_name: str) -> Tuple[bool, str]:
+        """写入新用户记录（调用方持有锁）"""
         users = self._load_users()
 
         if username in users:
@@ -166,82 +366,120 @@ class UserManager:
         # 创建用户数据
         user_data = {
             'username': username,
-            'password': password,  # 明文密码
+            'password_hash': password_hash,
             'role': role,
             'email': email,
             'display_name': display_name or username,
             'created_at': datetime.now().isoformat(),
             'last_login': None,
-            'is_active': True,
-            'memos': []  # 备忘录数据
+            'is_active': True
         }
 
         users[username] = user_data
         self._save_users(users)
+        self._invalidate_user_cache(username)
 
         return True, f"User {username} created successfully"
 
     def authenticate_user(self, username: str, password: str) -> Tuple[bool, Optional[Dict]]:
-        """用户认证"""
-        users = self._load_users()
-
-        if username not in users:
+        """用户认证（密码哈希校验在锁外进行，慢哈希不阻塞其他请求的会话验证）"""
+        with self._lock:
+            user = self._load_users().get(username)
+            if user is None or not user.get('is_active', True):
+                return False, None
+            stored_hash = user.get('password_hash')
+            plaintext = user.get('password')
+
+        if stored_hash:
+            verified = _verify_password(password, stored_hash)
+            rehash = False
+        else:
+            # 旧版明文密码：常数时间比较，通过后迁移为哈希
+            verified = plaintext is not None and hmac.compare_digest(
+                plaintext.encode('utf-8'), password.encode('utf-8'))
+            rehash = verified
+
+        if not verified:
             return False, None
 
-        user = users[username]
+        new_hash = _hash_password(password) if rehash else None
 
-        if not user.get('is_active', True):
-            return False, None
+        with self._lock:
+            users = self._load_users()
+            user = users.get(username)
+            if user is None:
+                return False, None
 
-        if user.get('password') == password or user.get('password_hash') and password in ['horizon', 'yyf']:
-            # 兼容旧格式和新格式 - 简单明文密码验证
             # 更新最后登录时间
             user['last_login'] = datetime.now().isoformat()
-            users[username] = user
+            if new_hash and 'password_hash' not in user and user.get('password') == plaintext:
+                user['password_hash'] = new_hash
+                user.pop('password', None)
             self._save_users(users)
 
-            return True, {
-                'username': user['username'],
-                'role': user['role'],
-                'display_name': user['display_name'],
-                'email': user['email'],
-                'role_info': self.USER_ROLES[user['role']]
-            }
+            return True, self._user_info(user)
 
-        return False, None
+    def _user_info(self, user: Dict) -> Dict:
+        """登录与会话验证返回的用户信息"""
+        return {
+            'username': user['username'],
+            'role': user['role'],
+            'display_name': user['display_name'],
+            'email': user['email'],
+            'role_info': self.USER_ROLES[user['role']]
+        }
 
+    @_synchronized
     def create_session(self, username: str) -> str:
         """创建用户会话"""
         session_token = secrets.token_urlsafe(32)
         sessions = self._load_sessions()
 
-        # 清理过期会话
-        self._cleanup_expired_sessions()
+        # 过期会话每 SESSION_CLEANUP_INTERVAL 秒才扫描清理一次（过期会话在验证时本就会被拒绝并删除）
+        now_mono = time.monotonic()
+        if now_mono - self._last_session_cleanup >= SESSION_CLEANUP_INTERVAL:
+            self._drop_expired_sessions(sessions)
+            self._last_session_cleanup = now_mono
 
         # 创建新会话
+        now = datetime.now()
         sessions[session_token] = {
             'username': username,
-            'created_at': datetime.now().isoformat(),
-            'expires_at': (datetime.now() + timedelta(hours=24)).isoformat()
+            'created_at': now.isoformat(),
+            'expires_at': (now + timedelta(hours=24)).timestamp()  # Unix 时间戳，校验时直接与 time.time() 比较
         }
 
         self._save_sessions(sessions)
+
+        # 登录后的首个请求直接命中会话缓存
+        user = self._load_users().get(username)
+        if user is not None:
+            self._cache_session(session_token, self._user_info(user), SESSION_CACHE_TTL)
         return session_token
 
+    @_synchronized
     def validate_session(self, session_token: str) -> Optional[Dict]:
-        """验证会话"""
+        """验证会话（结果在进程内缓存 SESSION_CACHE_TTL 秒，最多缓存 SESSION_CACHE_SIZE 个会话）"""
+        cached = self._session_cache.get(session_token)
+        if cached and time.monotonic() < cached[0]:
+            self._session_cache.move_to_end(session_token)
+            return cached[1]
+
         sessions = self._load_sessions()
 
         if session_token not in sessions:
+            self._session_cache.pop(session_token, None)
             return None
 
         session = sessions[session_token]
-        expires_at = datetime.fromisoformat(session['expires_at'])
+        expires_at = self._session_expiry(session)
+        current_time = time.time()
 
-        if datetime.now() > expires_at:
+        if current_time > expires_at:
             # 会话过期，删除
             del sessions[session_token]
             self._save_sessions(sessions)
+            self._session_cache.pop(session_token, None)
             return None
 
         # 获取用户信息
@@ -249,36 +487,59 @@ class UserManager:
         username = session['username']
 
         if username in users:
-            user = users[username]
-            return {
-                'username': user['username'],
-                'role': user['role'],
-                'display_name': user['display_name'],
-                'email': user['email'],
-                'role_info': self.USER_ROLES[user['role']]
-            }
+            user_info = self._user_info(users[username])
+            # 缓存时间不超过会话本身的剩余有效期
+            self._cache_session(session_token, user_info, min(SESSION_CACHE_TTL, expires_at - current_time))
+            return user_info
 
         return None
 
-    def _cleanup_expired_sessions(self):
-        """清理过期会话"""
-        sessions = self._load_sessions()
-        current_time = datetime.now()
-
-        expired_sessions = []
-        for token, session in sessions.items():
-            expires_at = datetime.fromisoformat(session['expires_at'])
-            if current_time > expires_at:
-                expired_sessions.append(token)
+    def _cache_session(self, session_token: str, user_info: Dict, ttl: float):
+        """写入会话验证缓存，超过 SESSION_CACHE_SIZE 时淘汰最久未用的会话"""
+        self._session_cache[session_token] = (time.monotonic() + ttl, user_info)
+        self._session_cache.move_to_end(session_token)
+        while len(self._session_cache) > SESSION_CACHE_SIZE:
+            self._session_cache.popitem(last=False)
+
+    @staticmethod
+    def _session_expiry(session: Dict) -> float:
+        """会话过期时间（Unix 时间戳）；兼容旧版会话文件中的 isoformat 字符串"""
+        expires_at = session['expires_at']
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at).timestamp()
+        return expires_at
+
+    def _invalidate_user_cache(self, username: str):
+        """清除某个用户的会话与权限缓存（创建、角色或状态变更后调用）"""
+        self._role_cache.pop(username, None)
+        for token, (_, info) in list(self._session_cache.items()):
+            if info['username'] == username:
+                self._session_cache.pop(token, None)
+
+    def _drop_expired_sessions(self, sessions: Dict) -> bool:
+        """从已加载的会话字典中移除过期会话，返回是否有删除"""
+        current_time = time.time()
+
+        expired_sessions = [token for token, session in sessions.items()
+                            if current_time > self._session_expiry(session)]
 
         for token in expired_sessions:
             del sessions[token]
+            self._session_cache.pop(token, None)
+
+        return bool(expired_sessions)
 
-        if expired_sessions:
+    @_synchronized
+    def _cleanup_expired_sessions(self):
+        """清理过期会话"""
+        sessions = self._load_sessions()
+        if self._drop_expired_sessions(sessions):
             self._save_sessions(sessions)
 
+    @_synchronized
     def logout_user(self, session_token: str) -> bool:
         """用户登出"""
+        self._session_cache.pop(session_token, None)
         sessions = self._load_sessions()
 
         if session_token in sessions:
@@ -288,42 +549,46 @@ class UserManager:
 
         return False
 
-    def check_permission(self, username: str, permission: str) -> bool:
-        """检查用户权限"""
-        users = self._load_users()
+    @_synchronized
+    def _get_user_role(self, username: str) -> Optional[str]:
+        """获取用户角色（结果在进程内缓存 PERMISSION_CACHE_TTL 秒）"""
+        cached = self._role_cache.get(username)
+        if cached and time.monotonic() < cached[0]:
+            return cached[1]
 
-        if username not in users:
-            return False
+        users = self._load_users()
+        role = users[username]['role'] if username in users else None
+        self._role_cache[username] = (time.monotonic() + PERMISSION_CACHE_TTL, role)
+        return role
 
-        user = users[username]
-        role = user['role']
+    def check_permission(self, username: str, permission: str) -> bool:
+        """检查用户权限"""
+        permissions = self._ROLE_PERMISSIONS.get(self._get_user_role(username))
 
-        if role not in self.USER_ROLES:
+        if permissions is None:
             return False
 
-        return permission in self.USER_ROLES[role]['permissions']
+        return permission in permissions
 
     def check_sector_access(self, username: str, sector: str) -> bool:
         """检查用户sector访问权限"""
-        users = self._load_users()
-
-        if username not in users:
-            return False
+        role_sectors = self._ROLE_SECTORS.get(self._get_user_role(username))
 
-        user = users[username]
-        role = user['role']
-
-        if role not in self.USER_ROLES:
+        if role_sectors is None:
             return False
 
-        role_sectors = self.USER_ROLES[role]['sectors']
-
         # 如果用户有'all'权限，可以访问所有sector
         if 'all' in role_sectors:
             return True
 
         return sector in role_sectors
 
+    @_synchronized
+    def user_exists(self, username: str) -> bool:
+        """用户是否存在"""
+        return username in self._load_users()
+
+    @_synchronized
     def get_user_info(self, username: str) -> Optional[Dict]:
         """获取用户信息"""
         users = self._load_users()
@@ -343,6 +608,7 @@ class UserManager:
             'role_info': self.USER_ROLES[user['role']]
         }
 
+    @_synchronized
     def list_users(self) -> List[Dict]:
         """列出所有用户（管理员功能）"""
         users = self._load_users()
@@ -362,6 +628,7 @@ class UserManager:
 
         return user_list
 
+    @_synchronized
     def update_user_role(self, username: str, new_role: str) -> Tuple[bool, str]:
         """更新用户角色（管理员功能）"""
         if new_role not in self.USER_ROLES:
@@ -374,9 +641,11 @@ class UserManager:
 
         users[username]['role'] = new_role
         self._save_users(users)
+        self._invalidate_user_cache(username)
 
         return True, f"User {username} role updated to {new_role}"
 
+    @_synchronized
     def deactivate_user(self, username: str) -> Tuple[bool, str]:
         """停用用户（管理员功能）"""
         users = self._load_users()
@@ -386,9 +655,11 @@ class UserManager:
 
         users[username]['is_active'] = False
         self._save_users(users)
+        self._invalidate_user_cache(username)
 
         return True, f"User {username} deactivated"
 
+    @_synchronized
     def activate_user(self, username: str) -> Tuple[bool, str]:
         """激活用户（管理员功能）"""
         users = self._load_users()
@@ -398,6 +669,7 @@ class UserManager:
 
         users[username]['is_active'] = True
         self._save_users(users)
+        self._invalidate_user_cache(username)
 
         return True, f"User {username} activated"
 
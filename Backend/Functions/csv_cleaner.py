@@ -6,7 +6,57 @@ CSV数据清洗和转换功能模块
 import pandas as pd
 import numpy as np
 import re
-from typing import Optional, Dict, List, Any
+import warnings
+from typing import Optional, List, Any
+
+
+# formatting 中 date 任务支持的输出格式
+DATE_FORMATS = {
+    "YYYY-MM-DD": "%Y-%m-%d",
+    "DD_MM_YY": "%d-%m-%y",
+    "MM-YY": "%m-%y",
+}
+
+# clean_column_names 使用的正则（模块加载时编译一次）
+_WHITESPACE_RE = re.compile(r"\s+")
+_SPECIAL_CHARS_RE = re.compile(r"[^0-9a-zA-Z_]+")
+
+
+def _title_case(name: str) -> str:
+    """按 ``_`` 分段后逐段首字母大写"""
+    return "_".join(part.capitalize() for part in name.split("_"))
+
+
+def _format_dates(series: pd.Series, date_format: str) -> pd.Series:
+    """整列交给 pandas 解析（无法识别的值置为 NaT），再按 date_format 输出字符串"""
+    series = pd.to_datetime(series.astype(str), errors="coerce", format="mixed", dayfirst=False)
+    strftime = DATE_FORMATS.get(date_format)
+    if strftime is None:
+        return series
+    return series.dt.strftime(strftime)
+
+
+def _group_jobs(mapping: list[dict]) -> list[dict]:
+    """合并相邻且参数完全相同的格式化任务
+
+    前后两个任务除 Column 外参数一致、且列不重叠时，合并为一个任务，
+    这样同类变换可以对整块列一次执行；不相邻的任务保持原有顺序。
+    """
+    grouped: list[dict] = []
+    for m in mapping:
+        params = {k: v for k, v in m.items() if k != 'Column'}
+        cols = list(m.get('Column', []))
+        if grouped:
+            last = grouped[-1]
+            last_params = {k: v for k, v in last.items() if k != 'Column'}
+            # 按列给出的参数（list/tuple）与 Column 一一对应，不能合并
+            per_column = any(isinstance(v, (list, tuple)) for v in params.values())
+            if (last_params == params and not per_column
+                    and not set(last['Column']) & set(cols)):
+                last['Column'] = last['Column'] + cols
+                continue
+        grouped.append({**m, 'Column': cols})
+    return grouped
 
 
 class CSVCleaner:
@@ -33,34 +83,30 @@ class CSVCleaner:
         """
 
         df = df.copy()
-        target_cols = set(df.columns if cols is None else cols)
-        normalised = []
-
-        for original in df.columns:
-            if original not in target_cols:
-                normalised.append(original)
-                continue
-
-            if not isinstance(original, str):
-                normalised.append(original)
-                continue
-
-            col = original.strip()
-            col = re.sub(r"\s+", "_", col)
-            if strip_special:
-                col = re.sub(r"[^0-9a-zA-Z_]+", "", col)
-
-            case_value = (case or "").lower()
-            if case_value == "upper":
-                col = col.upper()
-            elif case_value == "lower":
-                col = col.lower()
-            elif case_value == "title":
-                col = "_".join(part.capitalize() for part in col.split("_"))
-
-            normalised.append(col)
-
-        df.columns = normalised
+        columns = df.columns
+
+        # 只处理目标列中的字符串列名，其余原样保留
+        mask = np.fromiter((isinstance(col, str) for col in columns), dtype=bool, count=len(columns))
+        if cols is not None:
+            mask &= columns.isin(list(cols))
+
+        # 整批列名用 .str 方法链处理，不再逐列调用 re.sub
+        names = pd.Series(columns[mask].tolist(), dtype=object).str.strip()
+        names = names.str.replace(_WHITESPACE_RE, "_", regex=True)
+        if strip_special:
+            names = names.str.replace(_SPECIAL_CHARS_RE, "", regex=True)
+
+        case_value = (case or "").lower()
+        if case_value == "upper":
+            names = names.str.upper()
+        elif case_value == "lower":
+            names = names.str.lower()
+        elif case_value == "title":
+            names = names.map(_title_case)
+
+        normalised = np.asarray(columns, dtype=object).copy()
+        normalised[mask] = names.to_numpy(dtype=object)
+        df.columns = normalised.tolist()
         return df
 
     @staticmethod
@@ -105,9 +151,13 @@ class CSVCleaner:
         if strip_whitespace:
             obj_cols = df.select_dtypes(include=["object"]).columns
             for col in obj_cols:
-                df[col] = df[col].apply(
-                    lambda x: x.strip() if isinstance(x, str) else x
-                )
+                series = df[col]
+                try:
+                    stripped = series.str.strip()
+                except AttributeError:
+                    continue  # 该列没有字符串值
+                # .str 对非字符串返回 NaN，这些位置保留原值
+                df[col] = stripped.where(stripped.notna(), series)
 
         # 统一缺失值
         if normalize_missing:
@@ -156,116 +206,112 @@ class CSVCleaner:
                 return [int(i) for i in loc.tolist()]
             return [int(loc)]
 
-        def _update_column(column: str, transform):
-            indices = _column_indices(column)
-            for idx in indices:
-                original = df.iloc[:, idx]
-                transformed = transform(original)
-                if isinstance(transformed, pd.Series):
-                    transformed = transformed.reindex(df.index)
-                    if transformed.dtype == object:
-                        df.iloc[:, idx] = transformed.tolist()
-                    else:
-                        df.iloc[:, idx] = transformed
-                else:
-                    df.iloc[:, idx] = transformed
+        def _set_column(idx: int, transformed):
+            # 整列替换而不是写入原 object 列，保留变换结果自身的 dtype（Int64/float64/boolean 等）
+            if isinstance(transformed, pd.Series):
+                df.isetitem(idx, transformed.reindex(df.index))
+            else:
+                df.iloc[:, idx] = transformed
 
-        for m in mapping:
+        def _update_column(column: str, transform):
+            for idx in _column_indices(column):
+                _set_column(idx, transform(df.iloc[:, idx]))
+
+        def _block_indices(columns: list[str]) -> list[int]:
+            return list(dict.fromkeys(idx for col in columns for idx in _column_indices(col)))
+
+        def _update_block(columns: list[str], transform):
+            """对多列一次性应用变换：transform 接收按位置编号列的 DataFrame，返回同形状的 DataFrame"""
+            indices = _block_indices(columns)
+            if not indices:
+                return
+            block = df.iloc[:, indices].set_axis(range(len(indices)), axis=1)
+            result = transform(block)
+            for pos, idx in enumerate(indices):
+                _set_column(idx, result[pos])
+
+        def _per_column(columns: list[str], values):
+            """list/tuple 参数与 Column 一一对应，展开成与 _block_indices 顺序一致的数组以便广播"""
+            if not isinstance(values, (list, tuple)):
+                return values
+            per_col = dict(zip(columns, values))
+            return np.array([per_col[df.columns[idx]] for idx in _block_indices(columns)], dtype=np.float64)
+
+        def _to_numeric(block: pd.DataFrame) -> pd.DataFrame:
+            return block.apply(pd.to_numeric, errors="coerce")
+
+        def _normalize_str(series: pd.Series) -> pd.Series:
+            return series.astype(str).str.strip().str.upper().str.replace(" ", "_", regex=False)
+
+        for m in _group_jobs(mapping):
             cols = m.get('Column', [])
             trans_type = m.get('trans_type', None)
 
             if trans_type == 'str':
-                for col in cols:
-                    if col in df.columns:
-                        def _str_transform(series: pd.Series) -> pd.Series:
-                            series = series.astype(str)
-                            series = series.str.upper()
-                            series = series.str.strip()
-                            return series.str.replace(" ", "_")
-
-                        _update_column(col, _str_transform)
+                _update_block(cols, lambda block: block.apply(_normalize_str))
 
             elif trans_type == 'int':
-                for col in cols:
-                    if col in df.columns:
-                        def _int_transform(series: pd.Series) -> pd.Series:
-                            return pd.to_numeric(series, errors="coerce").astype("Int64")
-
-                        _update_column(col, _int_transform)
+                _update_block(cols, lambda block: _to_numeric(block).astype("Int64"))
 
             elif trans_type == 'float':
                 decimals = int(m.get('decimals', 4)) if m.get('decimals') is not None else 4
-                for col in cols:
-                    if col in df.columns:
-                        def _float_transform(series: pd.Series) -> pd.Series:
-                            return pd.to_numeric(series, errors="coerce").round(decimals)
-
-                        _update_column(col, _float_transform)
+                _update_block(cols, lambda block: _to_numeric(block).round(decimals))
 
             elif trans_type == 'bool':
-                for col in cols:
-                    if col in df.columns:
-                        _update_column(col, lambda series: series.astype("boolean"))
+                _update_block(cols, lambda block: block.astype("boolean"))
 
             elif trans_type == 'percent':
                 decimals = int(m.get('decimals', 2)) if m.get('decimals') is not None else 2
-                for col in cols:
-                    if col in df.columns:
-                        def _percent_transform(series: pd.Series) -> pd.Series:
-                            series = pd.to_numeric(series, errors="coerce") * 100
-                            series = series.round(decimals)
-                            return series.apply(lambda x: f"{x}%" if pd.notna(x) else pd.NA)
 
-                        _update_column(col, _percent_transform)
+                def _percent_transform(block: pd.DataFrame) -> pd.DataFrame:
+                    block = (_to_numeric(block) * 100).round(decimals)
+                    return (block.astype(str) + "%").mask(block.isna(), pd.NA)
+
+                _update_block(cols, _percent_transform)
 
             elif trans_type == 'date':
                 date_format = m.get("format", "YYYY-MM-DD")
-
-                from dateutil import parser
-                def parse_date(val):
-                    try:
-                        return parser.parse(str(val), dayfirst=False, yearfirst=False)
-                    except Exception:
-                        return pd.NaT
-
-                for col in cols:
-                    if col in df.columns:
-                        def _date_transform(series: pd.Series) -> pd.Series:
-                            series = series.apply(parse_date)
-                            series = pd.to_datetime(series, errors="coerce")
-                            if date_format == "YYYY-MM-DD":
-                                return series.dt.strftime("%Y-%m-%d")
-                            if date_format == "DD_MM_YY":
-                                return series.dt.strftime("%d-%m-%y")
-                            if date_format == "MM-YY":
-                                return series.dt.strftime("%m-%y")
-                            return series
-
-                        _update_column(col, _date_transform)
+                _update_block(cols, lambda block: block.apply(_format_dates, args=(date_format,)))
 
             elif trans_type == "scale":
-                factor = m.get("factor", 1)
                 operation = m.get("operation", "mul")
-                for col in cols:
-                    if col in df.columns:
-                        def _scale_transform(series: pd.Series) -> pd.Series:
-                            series = pd.to_numeric(series, errors="coerce")
-                            if operation == "mul":
-                                return series * factor
-                            if operation == "div":
-                                return series / factor
-                            if operation == "add":
-                                return series + factor
-                            if operation == "sub":
-                                return series - factor
-                            return series
-
-                        _update_column(col, _scale_transform)
-
+                factor = _per_column(cols, m.get("factor", 1))
+
+                def _scale_transform(block: pd.DataFrame) -> pd.DataFrame:
+                    block = _to_numeric(block)
+                    if operation == "mul":
+                        return block * factor
+                    if operation == "div":
+                        return block / factor
+                    if operation == "add":
+                        return block + factor
+                    if operation == "sub":
+                        return block - factor
+                    return block
+
+                _update_block(cols, _scale_transform)
+
+            elif trans_type == "normalize":
+                # 最小-最大归一化 (x - min) / span，一次遍历完成
+                mins = _per_column(cols, m.get("min", 0))
+                spans = _per_column(cols, m.get("span", 1))
+                _update_block(cols, lambda block: (_to_numeric(block) - mins) / spans)
 
             elif trans_type == 'missing':
                 strategy = m.get("strategy", None)
                 fill_value = m.get("fill_value")
+                if strategy in ("mean", "median"):
+                    # 所有目标列一次性求统计量并填充，避免逐列分发
+                    indices = _block_indices(cols)
+                    if indices:
+                        block = df.iloc[:, indices].apply(pd.to_numeric, errors="coerce")
+                        block.columns = range(len(indices))
+                        stats = block.mean() if strategy == "mean" else block.median()
+                        filled = block.fillna(stats)
+                        for pos, idx in enumerate(indices):
+                            _set_column(idx, filled[pos])
+                    continue
+
                 for col in cols:
                     if col in df.columns:
                         def _missing_transform(series: pd.Series) -> pd.Series:
@@ -281,7 +327,11 @@ class CSVCleaner:
                                     return series.fillna(mode_series.iloc[0])
                                 return series
                             if strategy == "constant":
-                                return series.fillna(fill_value)
+                                try:
+                                    return series.fillna(fill_value)
+                                except (TypeError, ValueError):
+                                    # 带类型的列（如 Int64）放不下该常量时退回 object 再填充
+                                    return series.astype(object).fillna(fill_value)
                             if strategy == "nan":
                                 return series.fillna(pd.NA)
                             return series
@@ -292,54 +342,57 @@ class CSVCleaner:
                 method = m.get("method", "zscore")
                 replace = m.get("replace", "nan")
                 threshold = m.get("threshold", 3)
-                for col in cols:
-                    if col in df.columns:
-                        def _outlier_transform(series: pd.Series) -> pd.Series:
-                            numeric = pd.to_numeric(series, errors="coerce")
-                            if numeric.isna().all():
-                                return numeric
-
-                            mask = pd.Series(False, index=series.index)
-                            lower_bound = None
-                            upper_bound = None
-
-                            if method == "zscore":
-                                mean = numeric.mean()
-                                std = numeric.std()
-                                if pd.isna(std) or std == 0:
-                                    return numeric
-                                mask = (numeric - mean).abs() > threshold * std
-                                lower_bound = mean - threshold * std
-                                upper_bound = mean + threshold * std
-                            elif method == "iqr":
-                                q1 = numeric.quantile(0.25)
-                                q3 = numeric.quantile(0.75)
-                                if pd.isna(q1) or pd.isna(q3):
-                                    return numeric
-                                iqr = q3 - q1
-                                lower_bound = q1 - threshold * iqr
-                                upper_bound = q3 + threshold * iqr
-                                mask = (numeric < lower_bound) | (numeric > upper_bound)
-
-                            if not mask.any():
-                                return numeric
-
-                            if replace == "mean":
-                                return numeric.mask(mask, numeric.mean())
-                            if replace == "median":
-                                return numeric.mask(mask, numeric.median())
-                            if replace == "clip":
-                                if lower_bound is None or upper_bound is None:
-                                    return numeric
-                                clipped = numeric.clip(lower_bound, upper_bound)
-                                return numeric.mask(mask, clipped)
-                            if replace == "nan":
-                                return numeric.mask(mask, pd.NA)
-                            return numeric
-
-                        _update_column(col, _outlier_transform)
-
-        df = df.astype(object).where(df.notna(), float("nan"))
+                indices = _block_indices(cols)
+                if not indices:
+                    continue
+
+                # 所有目标列堆叠为二维数组，按列一次性计算统计量与异常掩码
+                numeric = df.iloc[:, indices].apply(pd.to_numeric, errors="coerce")
+                numeric.columns = range(len(indices))
+                arr = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    if method == "zscore":
+                        mean = np.nanmean(arr, axis=0)
+                        std = np.nanstd(arr, axis=0, ddof=1)
+                        valid = ~np.isnan(std) & (std != 0)
+                        lower_bound = mean - threshold * std
+                        upper_bound = mean + threshold * std
+                        mask = np.abs(arr - mean) > threshold * std
+                    elif method == "iqr":
+                        q1, q3 = np.nanquantile(arr, [0.25, 0.75], axis=0)
+                        valid = ~(np.isnan(q1) | np.isnan(q3))
+                        iqr = q3 - q1
+                        lower_bound = q1 - threshold * iqr
+                        upper_bound = q3 + threshold * iqr
+                        mask = (arr < lower_bound) | (arr > upper_bound)
+                    else:
+                        valid = np.zeros(arr.shape[1], dtype=bool)
+                        mask = np.zeros(arr.shape, dtype=bool)
+
+                    mask &= valid
+                    if replace == "mean":
+                        fill = np.nanmean(arr, axis=0)
+                    elif replace == "median":
+                        fill = np.nanmedian(arr, axis=0)
+
+                # 只对命中异常的列做替换，沿用 Series.mask 的 dtype 规则
+                if replace in ("mean", "median", "clip", "nan"):
+                    for pos in np.flatnonzero(mask.any(axis=0)):
+                        column = numeric[pos]
+                        hit = pd.Series(mask[:, pos], index=column.index)
+                        if replace == "clip":
+                            numeric[pos] = column.mask(hit, column.clip(lower_bound[pos], upper_bound[pos]))
+                        elif replace == "nan":
+                            numeric[pos] = column.mask(hit, pd.NA)
+                        else:
+                            numeric[pos] = column.mask(hit, fill[pos])
+
+                for pos, idx in enumerate(indices):
+                    _set_column(idx, numeric[pos])
+
+        # 各列保留变换后的 dtype，不再整体转回 object；缺失值由导出/序列化环节处理
         return df
 
 # 全局清洗器实例
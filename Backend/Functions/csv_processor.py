@@ -3,22 +3,33 @@ CSV/Excel 文件处理核心功能模块
 将文件读取、预览、摘要等功能从controller中分离
 """
 
+import os
+import codecs
+import hashlib
+import threading
+from collections import OrderedDict
 from io import BytesIO
-from typing import Optional, Tuple, Dict, List
+from typing import Optional, Tuple, Dict, List, Union, BinaryIO, Iterator
 import pandas as pd
 import numpy as np
 import re
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Border, Side, Alignment
 
 
 # 依赖检查
 _USE_PYARROW = False
 _HAS_OPENPYXL = False
 _HAS_XLRD = False
+_HAS_XLSXWRITER = False
+_HAS_CALAMINE = False
+_HAS_XXHASH = False
 
 try:
-    import pyarrow
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pacsv
     _USE_PYARROW = True
 except ImportError:
     pass
@@ -35,10 +46,50 @@ try:
 except ImportError:
     pass
 
+try:
+    import xlsxwriter
+    _HAS_XLSXWRITER = True
+except ImportError:
+    pass
+
+try:
+    # 非加密哈希，比 blake2b 快数倍，用于解析缓存的键
+    import xxhash
+    _HAS_XXHASH = True
+except ImportError:
+    pass
+
+try:
+    # Rust 实现的 Excel 读取（pandas>=2.2 的 engine='calamine'），.xls/.xlsx 均可读取
+    import python_calamine
+    _HAS_CALAMINE = True
+except ImportError:
+    pass
+
 # 常量配置
-MISSING_VALUES = {'', 'nan', 'None', 'NaN', 'null', 'NULL', 'NA', 'N/A'}
-NUMERIC_PATTERN = re.compile(r'^-?\d+(\.\d+)?$')
-DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}')
+MISSING_VALUES = frozenset(('', 'nan', 'None', 'NaN', 'null', 'NULL', 'NA', 'N/A'))
+# 数值与日期合并为一个正则，样本只匹配一次；命中的分组名即类型
+SAMPLE_TYPE_PATTERN = re.compile(r'^(?:(?P<numeric>-?\d+(?:\.\d+)?$)|(?P<date>\d{4}-\d{2}-\d{2}))')
+NAN_TEXT = ['nan', '+nan', '-nan']
+FILL_UP_COLOR = 'FFFF00'    # 上升：黄色
+FILL_DOWN_COLOR = '00FF00'  # 下降：绿色
+
+# FAST_IO=arrow 时 CSV 默认直接用 pyarrow.csv 解析（也可按请求传 engine=arrow）
+FAST_IO = os.environ.get('FAST_IO', '').lower()
+# pyarrow 解析时视为缺失的文本，与 pandas read_csv 默认的 na_values 一致
+CSV_NULL_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+                   '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+ARROW_BLOCK_SIZE = 8 << 20  # 8MB
+# UTF-8 之后依次尝试的本地编码，全部失败时用 latin1 兜底
+LOCAL_ENCODINGS = ["gbk", "gb2312", "big5", "shift_jis", "cp1252"]
+# 流式处理时每块的行数
+CSV_CHUNK_ROWS = 100_000
+# 解析结果缓存：同一文件先后调用 preview/summary/clean 时不重复解析
+PARSE_CACHE_BYTES = 256 << 20      # 缓存的 DataFrame 总内存上限
+PARSE_CACHE_MAX_INPUT = 50 << 20   # 只缓存小于该大小的文件
+
+# 文件来源：内存中的字节串，或可 seek 的二进制文件对象（如上传请求中的临时文件）
+Source = Union[bytes, BinaryIO]
 
 
 class CSVProcessor:
@@ -48,22 +99,55 @@ class CSVProcessor:
         self.use_pyarrow = _USE_PYARROW
         self.has_openpyxl = _HAS_OPENPYXL
         self.has_xlrd = _HAS_XLRD
+        self.has_xlsxwriter = _HAS_XLSXWRITER
+        self.has_calamine = _HAS_CALAMINE
+        self.fast_io = FAST_IO == 'arrow'
+        # 解析缓存: key -> (DataFrame, 占用字节数)，按 LRU 顺序淘汰
+        self._parse_cache: "OrderedDict[tuple, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._parse_cache_bytes = 0
+        self._parse_cache_lock = threading.Lock()
+
+    @staticmethod
+    def _open(binary: Source) -> BinaryIO:
+        """返回可供 pandas 读取的文件对象：字节串包装为 BytesIO，文件对象回到开头后直接使用（不复制）"""
+        if isinstance(binary, (bytes, bytearray, memoryview)):
+            return BytesIO(binary)
+        binary.seek(0)
+        return binary
+
+    @classmethod
+    def _iter_blocks(cls, binary: Source, block_size: int = 1 << 20) -> Iterator[memoryview]:
+        """
+        从头按块读取文件内容，复用同一个缓冲区（readinto），不为每块新建 bytes
+
+        产出的 memoryview 在取下一块前有效
+        """
+        stream = cls._open(binary)
+        buf = bytearray(block_size)
+        view = memoryview(buf)
+        while True:
+            n = stream.readinto(buf)
+            if not n:
+                break
+            yield view[:n]
 
     def read_with_encoding_fallback(
         self,
-        binary: bytes,
+        binary: Source,
         nrows: Optional[int] = None,
         sep: Optional[str] = None,
-        encoding: Optional[str] = None
+        encoding: Optional[str] = None,
+        dtype=None
     ) -> pd.DataFrame:
         """
         使用编码回退机制读取CSV
 
         Args:
-            binary: CSV二进制数据
+            binary: CSV二进制数据或文件对象
             nrows: 限制读取行数
             sep: 分隔符
             encoding: 指定编码（如提供则直接使用）
+            dtype: 传给 read_csv 的列类型
 
         Returns:
             pd.DataFrame: 解析后的数据
@@ -73,92 +157,274 @@ class CSVProcessor:
             base_kwargs["nrows"] = nrows
         if sep is not None:
             base_kwargs["sep"] = sep
+        if dtype is not None:
+            base_kwargs["dtype"] = dtype
 
         # 指定编码直接使用
         if encoding:
-            bio = BytesIO(binary)
+            bio = self._open(binary)
             return pd.read_csv(bio, encoding=encoding, **base_kwargs)
 
         # UTF-8 优先（使用PyArrow加速）
-        utf8_tries = [
-            ("utf-8", self.use_pyarrow),
-            ("utf-8-sig", self.use_pyarrow)
-        ]
-
-        for enc, use_pa in utf8_tries:
-            try:
-                bio = BytesIO(binary)
-                engine = "pyarrow" if use_pa else "c"
-                return pd.read_csv(bio, encoding=enc, engine=engine, **base_kwargs)
-            except Exception:
-                continue
-
-        # 本地编码回退
-        local_encodings = ["gbk", "gb2312", "big5", "shift_jis", "cp1252"]
-        for enc in local_encodings:
+        # PyArrow 引擎不支持 nrows 且总会读完整个文件；只取前 N 行（预览）时改用 C 引擎，
+        # 它按块读取，解析到第 N 行就停止。指定 dtype（如按文本读取）时 C 引擎直接生成
+        # Python 字符串，比 PyArrow 引擎再从 Arrow 字符串转换快得多，同样改用 C 引擎
+        use_pa = self.use_pyarrow and nrows is None and dtype is None
+        candidates = [("utf-8", use_pa), ("utf-8-sig", use_pa)] + [(enc, False) for enc in LOCAL_ENCODINGS]
+
+        # 读取整个文件时先增量解码找出第一个能完整解码的编码（不构建 DataFrame，比解析快得多），
+        # 排在它前面的编码直接跳过，不再逐个完整解析；PyArrow 引擎遇到非 UTF-8 字节会读成 bytes 而不报错，
+        # 预先判定也避免了这种情况。只读前 N 行时不同编码可能都能读通，仍按原顺序尝试
+        if nrows is None:
+            detected = self.detect_encoding(binary)
+            if detected in LOCAL_ENCODINGS:
+                candidates = candidates[2 + LOCAL_ENCODINGS.index(detected):]
+            elif detected == "latin1":
+                candidates = []
+
+        for enc, use_pa in candidates:
             try:
-                bio = BytesIO(binary)
+                bio = self._open(binary)
+                if use_pa:
+                    return pd.read_csv(bio, encoding=enc, engine="pyarrow", **base_kwargs)
                 return pd.read_csv(bio, encoding=enc, **base_kwargs)
             except Exception:
                 continue
 
         # 最后兜底：latin1
-        bio = BytesIO(binary)
+        bio = self._open(binary)
         return pd.read_csv(bio, encoding="latin1", **base_kwargs)
 
+    def detect_encoding(self, binary: Source) -> str:
+        """
+        按 read_with_encoding_fallback 的顺序找出能完整解码文件的编码
+
+        分块增量解码，只占用一个块的内存
+        """
+        for enc in ["utf-8"] + LOCAL_ENCODINGS:
+            decoder = codecs.getincrementaldecoder(enc)()
+            try:
+                for block in self._iter_blocks(binary):
+                    decoder.decode(block)
+                decoder.decode(b"", final=True)
+                return enc
+            except UnicodeDecodeError:
+                continue
+        return "latin1"
+
+    def iter_csv_chunks(
+        self,
+        binary: Source,
+        chunksize: int = CSV_CHUNK_ROWS,
+        sep: Optional[str] = None,
+        encoding: Optional[str] = None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        按块读取CSV，用于大文件的流式处理
+
+        所有列按原始文本读取（不做逐块的类型推断，避免同一列在不同块里被格式化成不同样子），
+        缺失值与 read_file_to_dataframe 一样转为字符串 'nan'
+        """
+        kwargs = {"sep": sep} if sep is not None else {}
+        enc = encoding or self.detect_encoding(binary)
+        with pd.read_csv(self._open(binary), encoding=enc, dtype=str, chunksize=chunksize, **kwargs) as reader:
+            for chunk in reader:
+                yield chunk.astype(str)
+
+    def _use_arrow(self, engine: Optional[str]) -> bool:
+        """是否走 pyarrow.csv 直读：请求显式指定 engine，否则看 FAST_IO 开关"""
+        if not self.use_pyarrow:
+            return False
+        if engine:
+            return engine.lower() == 'arrow'
+        return self.fast_io
+
+    def read_arrow_table(
+        self,
+        binary: Source,
+        sep: Optional[str] = None,
+        encoding: Optional[str] = None
+    ) -> Optional["pa.Table"]:
+        """
+        用 pyarrow.csv 多线程解析CSV，返回 Arrow Table
+
+        数值/布尔列按类型解析（与 pandas 一致），日期时间类列保留原始文本；
+        非 UTF-8 内容、后续数据块类型冲突等无法解析的情况返回 None，由调用方回退到 pandas
+
+        Args:
+            binary: CSV二进制数据或文件对象
+            sep: 分隔符，默认逗号
+            encoding: 指定编码，默认 UTF-8
+        """
+        read_options = pacsv.ReadOptions(use_threads=True, block_size=ARROW_BLOCK_SIZE,
+                                         encoding=encoding or 'utf8')
+        parse_options = pacsv.ParseOptions(delimiter=sep or ',')
+        convert_options = pacsv.ConvertOptions(null_values=CSV_NULL_VALUES, strings_can_be_null=True)
+        try:
+            # 先按首个数据块推断列类型，日期时间列改为按字符串读取，保持与 pandas 路径相同的文本
+            schema = pacsv.open_csv(self._open(binary), read_options=read_options,
+                                    parse_options=parse_options, convert_options=convert_options).schema
+            temporal = {f.name: pa.string() for f in schema if pa.types.is_temporal(f.type)}
+            if temporal:
+                convert_options = pacsv.ConvertOptions(null_values=CSV_NULL_VALUES, strings_can_be_null=True,
+                                                       column_types=temporal)
+            table = pacsv.read_csv(self._open(binary), read_options=read_options,
+                                   parse_options=parse_options, convert_options=convert_options)
+            # 整列为空时 Arrow 推断为 null 类型，转为 float64 与 pandas 的全 NaN 列一致
+            for i, field in enumerate(table.schema):
+                if pa.types.is_null(field.type):
+                    table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+            # 表头不做 UTF-8 校验，这里取列名时才会暴露编码错误
+            return table.rename_columns(self._mangle_columns(table.column_names))
+        except (pa.ArrowException, UnicodeDecodeError, LookupError):
+            return None
+
+    @staticmethod
+    def _mangle_columns(names: List[str]) -> List[str]:
+        """与 pandas read_csv 一致：空列名改为 Unnamed: i，重复列名依次加 .1/.2"""
+        result = []
+        seen: Dict[str, int] = {}
+        for i, name in enumerate(names):
+            name = name or f"Unnamed: {i}"
+            base = name
+            while name in seen:
+                seen[base] += 1
+                name = f"{base}.{seen[base]}"
+            seen[name] = 0
+            result.append(name)
+        return result
+
     def read_file_to_dataframe(
         self,
-        binary: bytes,
+        binary: Source,
         filename: Optional[str] = None,
         nrows: Optional[int] = None,
         sep: Optional[str] = None,
-        encoding: Optional[str] = None
+        encoding: Optional[str] = None,
+        engine: Optional[str] = None,
+        dtype=None,
+        as_text: bool = True
     ) -> pd.DataFrame:
         """
         统一入口：将CSV/Excel读取为DataFrame
 
         Args:
-            binary: 文件二进制数据
+            binary: 文件二进制数据或文件对象
             filename: 文件名（用于判断文件类型）
             nrows: 限制读取行数
             sep: CSV分隔符
             encoding: CSV编码
+            engine: CSV解析引擎，'arrow' 表示直接用 pyarrow.csv（默认由 FAST_IO 决定）
+            dtype: CSV列类型提示；传 str 可跳过类型推断，但数值列保留原始文本（如 '1.50' 不会变成 '1.5'）
+            as_text: 是否统一转换为字符串（默认是）；只读统计等场景传 False，保留解析出的类型，
+                省去整表转换（数值转字符串的开销往往比解析本身还大）
 
         Returns:
             pd.DataFrame: 处理后的数据框
         """
         name = (filename or "").lower()
-
-        # Excel文件处理
-        if name.endswith((".xls", ".xlsx")):
-            return self._read_excel(binary, name)
-
-        # CSV文件处理
-        df = self.read_with_encoding_fallback(binary, nrows=nrows, sep=sep, encoding=encoding)
+        is_excel = name.endswith((".xls", ".xlsx"))
+        use_arrow = not is_excel and nrows is None and dtype is None and self._use_arrow(engine)
+
+        # 完整解析的结果按内容哈希缓存（缓存转字符串之前的结果，概要统计和清洗共用；
+        # 预览只读前几行，本身很快，不缓存）。转字符串会生成新表，此时不必再复制缓存
+        df = None
+        key = None
+        if nrows is None:
+            digest = self._source_digest(binary)
+            if digest is not None:
+                key = (digest, os.path.splitext(name)[1], sep, encoding, use_arrow, dtype)
+                df = self._cache_get(key, copy=not as_text)
+
+        if df is None:
+            if is_excel:
+                df = self._read_excel(binary, name, nrows=nrows)
+            else:
+                if use_arrow:
+                    table = self.read_arrow_table(binary, sep=sep, encoding=encoding)
+                    if table is not None:
+                        df = table.to_pandas(self_destruct=True, split_blocks=True)
+                        # 字符串列的缺失值转出为 None，先统一为 NaN，转字符串后与 pandas 路径一样是 'nan'
+                        df = df.where(df.notna(), np.nan)
+                if df is None:
+                    df = self.read_with_encoding_fallback(binary, nrows=nrows, sep=sep, encoding=encoding,
+                                                          dtype=dtype)
+            if key is not None:
+                self._cache_put(key, df, copy=not as_text)
 
         # 统一转换为字符串，避免类型问题
-        df = df.astype(str)
-
+        if as_text:
+            df = df.astype(str)
         return df
 
-    def _read_excel(self, binary: bytes, filename: str) -> pd.DataFrame:
-        """读取Excel文件"""
-        bio = BytesIO(binary)
-
-        # 检查依赖
-        if filename.endswith(".xlsx") and not self.has_openpyxl:
-            raise ImportError("处理 .xlsx 文件需要 openpyxl 库，请安装: pip install openpyxl")
-        elif filename.endswith(".xls") and not self.has_xlrd:
-            raise ImportError("处理 .xls 文件需要 xlrd 库，请安装: pip install xlrd")
-
-        # 读取Excel
+    def _source_digest(self, binary: Source) -> Optional[bytes]:
+        """
+        计算文件内容的 128 位摘要作为缓存键（有 xxhash 时用 xxh3，否则用 blake2b），
+        超过 PARSE_CACHE_MAX_INPUT 时返回 None
+        """
+        h = xxhash.xxh3_128() if _HAS_XXHASH else hashlib.blake2b(digest_size=16)
+        if isinstance(binary, (bytes, bytearray, memoryview)):
+            if len(binary) >= PARSE_CACHE_MAX_INPUT:
+                return None
+            h.update(binary)
+            return h.digest()
+
+        binary.seek(0, os.SEEK_END)
+        size = binary.tell()
+        if size >= PARSE_CACHE_MAX_INPUT:
+            return None
+        for block in self._iter_blocks(binary):
+            h.update(block)
+        binary.seek(0)
+        return h.digest()
+
+    def _cache_get(self, key: tuple, copy: bool = True) -> Optional[pd.DataFrame]:
+        """命中时返回缓存的 DataFrame；调用方可能原地修改时 copy=True 返回副本"""
+        with self._parse_cache_lock:
+            entry = self._parse_cache.get(key)
+            if entry is None:
+                return None
+            self._parse_cache.move_to_end(key)
+            return entry[0].copy() if copy else entry[0]
+
+    def _cache_put(self, key: tuple, df: pd.DataFrame, copy: bool = True) -> None:
+        """缓存 DataFrame（调用方之后可能原地修改时 copy=True 存副本），超出 PARSE_CACHE_BYTES 时淘汰最久未使用的条目"""
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > PARSE_CACHE_BYTES:
+            return
+        frame = df.copy() if copy else df
+        with self._parse_cache_lock:
+            old = self._parse_cache.pop(key, None)
+            if old is not None:
+                self._parse_cache_bytes -= old[1]
+            self._parse_cache[key] = (frame, size)
+            self._parse_cache_bytes += size
+            while self._parse_cache_bytes > PARSE_CACHE_BYTES:
+                _, (_, evicted) = self._parse_cache.popitem(last=False)
+                self._parse_cache_bytes -= evicted
+
+    def _read_excel(self, binary: Source, filename: str, nrows: Optional[int] = None) -> pd.DataFrame:
+        """读取Excel文件（nrows 限制转换为 DataFrame 的数据行数），保留解析出的类型"""
+        bio = self._open(binary)
+
+        # 检查依赖（calamine 可同时读取 .xls/.xlsx）
+        if not self.has_calamine:
+            if filename.endswith(".xlsx") and not self.has_openpyxl:
+                raise ImportError("处理 .xlsx 文件需要 openpyxl 库，请安装: pip install openpyxl")
+            elif filename.endswith(".xls") and not self.has_xlrd:
+                raise ImportError("处理 .xls 文件需要 xlrd 库，请安装: pip install xlrd")
+
+        # 读取Excel：优先 calamine，比 openpyxl 快数倍且内存占用小
         try:
-            engine = "openpyxl" if filename.endswith(".xlsx") else "xlrd"
-            df = pd.read_excel(bio, engine=engine)
+            if self.has_calamine:
+                engine = "calamine"
+            else:
+                engine = "openpyxl" if filename.endswith(".xlsx") else "xlrd"
+            df = pd.read_excel(bio, engine=engine, nrows=nrows)
         except Exception as e:
             # 兜底尝试自动检测
             try:
-                df = pd.read_excel(bio)
+                df = pd.read_excel(self._open(binary), nrows=nrows)
             except Exception:
                 raise e
 
@@ -169,14 +435,11 @@ class CSVProcessor:
                 for col in df.columns.values
             ]
 
-        # 转换为字符串
-        df = df.astype(str)
-
         return df
 
     def get_preview(
         self,
-        binary: bytes,
+        binary: Source,
         n: int = 5,
         sep: Optional[str] = None,
         filename: Optional[str] = None,
@@ -186,14 +449,14 @@ class CSVProcessor:
         获取文件预览（前N行）
 
         Args:
-            binary: 文件二进制数据
+            binary: 文件二进制数据或文件对象
             n: 预览行数
             sep: CSV分隔符
             filename: 文件名
             encoding: CSV编码
 
         Returns:
-            dict: {'columns': [...], 'rows': [{...}, ...]}
+            dict: {'columns': [...], 'rows': [[...], ...]}，rows 中每行按 columns 的顺序排列
         """
         df = self.read_file_to_dataframe(
             binary,
@@ -205,41 +468,54 @@ class CSVProcessor:
 
         head = df.head(n)
 
+        # 按行返回列表而不是 {列名: 值} 字典，少建大量 Python 对象，重名列也不会丢值
         return {
-            'columns': list(head.columns),
-            'rows': head.to_dict(orient='records')
+            'columns': head.columns.tolist(),
+            'rows': head.to_numpy().tolist()
         }
 
     def get_summary(
         self,
-        binary: bytes,
+        binary: Source,
         sep: Optional[str] = None,
         filename: Optional[str] = None,
-        encoding: Optional[str] = None
+        encoding: Optional[str] = None,
+        engine: Optional[str] = None
     ) -> Dict:
         """
         获取文件概要统计信息
 
         Args:
-            binary: 文件二进制数据
+            binary: 文件二进制数据或文件对象
             sep: CSV分隔符
             filename: 文件名
             encoding: CSV编码
+            engine: CSV解析引擎，'arrow' 时直接基于 Arrow Table 统计，不转换为 DataFrame
 
         Returns:
             dict: 包含行数、列数、数据类型、缺失值统计等
         """
+        if not (filename or "").lower().endswith((".xls", ".xlsx")) and self._use_arrow(engine):
+            table = self.read_arrow_table(binary, sep=sep, encoding=encoding)
+            if table is not None:
+                return self._summarize_arrow(table)
+
+        # 统计只读不改，保留解析出的类型，不做整表转字符串
         df = self.read_file_to_dataframe(
             binary,
             filename=filename,
             sep=sep,
-            encoding=encoding
+            encoding=encoding,
+            engine='pandas',
+            as_text=False
         )
 
-        # 计算缺失值
+        # 计算缺失值，掩码同时交给类型推断复用，每列只扫描一次
         na_count = {}
-        for col in df.columns:
-            is_missing = df[col].isin(MISSING_VALUES) | df[col].isna()
+        missing_masks = []
+        for i, col in enumerate(df.columns):
+            is_missing = self._missing_mask(df.iloc[:, i])
+            missing_masks.append(is_missing)
             na_count[col] = int(is_missing.sum())
 
         total_rows = len(df)
@@ -249,7 +525,7 @@ class CSVProcessor:
         }
 
         # 推断数据类型
-        dtypes = self._infer_column_types(df)
+        dtypes = self._infer_column_types(df, missing_masks)
 
         return {
             'rows': int(total_rows),
@@ -260,31 +536,121 @@ class CSVProcessor:
             'na_ratio': na_ratio
         }
 
-    def _infer_column_types(self, df: pd.DataFrame) -> Dict[str, str]:
-        """推断列数据类型"""
+    def _summarize_arrow(self, table: "pa.Table") -> Dict:
+        """直接从 Arrow Table 计算概要信息，结果与 DataFrame 路径一致"""
+        missing_values = pa.array(sorted(MISSING_VALUES))
+        total_rows = table.num_rows
+        na_count = {}
         dtypes = {}
+        for name, column in zip(table.column_names, table.columns):
+            missing = pc.is_null(column)
+            if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+                missing = pc.or_(missing, pc.is_in(column, value_set=missing_values))
+            missing = pc.fill_null(missing, True)
+            na_count[name] = int(pc.sum(missing).as_py() or 0)
+
+            # 与 _infer_column_types 相同：取第一个非缺失值的文本判断类型
+            non_empty = pc.filter(column, pc.invert(missing))
+            if len(non_empty) == 0:
+                dtypes[name] = 'unknown'
+                continue
+            dtypes[name] = self._sample_type(str(non_empty[0].as_py()))
 
-        for col in df.columns:
-            # 获取非空值
-            non_empty = df[col][~(df[col].isin(MISSING_VALUES) | df[col].isna())]
+        na_ratio = {
+            k: round(v / total_rows, 4) if total_rows else 0.0
+            for k, v in na_count.items()
+        }
 
-            if len(non_empty) == 0:
+        return {
+            'rows': int(total_rows),
+            'cols': int(table.num_columns),
+            'columns': list(table.column_names),
+            'dtypes': dtypes,
+            'na_count': na_count,
+            'na_ratio': na_ratio
+        }
+
+    @staticmethod
+    def _sample_type(sample: str) -> str:
+        """按样本文本判断列类型：numeric / date / text"""
+        match = SAMPLE_TYPE_PATTERN.match(sample)
+        return match.lastgroup if match else 'text'
+
+    @staticmethod
+    def _missing_mask(series: pd.Series) -> np.ndarray:
+        """返回缺失值布尔数组（缺失文本只可能出现在文本或分类列中）"""
+        is_missing = series.isna().to_numpy()
+        if pd.api.types.is_string_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype):
+            is_missing |= series.isin(MISSING_VALUES).to_numpy()
+        return is_missing
+
+    def _infer_column_types(
+        self,
+        df: pd.DataFrame,
+        missing_masks: Optional[List[np.ndarray]] = None
+    ) -> Dict[str, str]:
+        """推断列数据类型，missing_masks 为 get_summary 已算好的各列缺失掩码"""
+        dtypes = {}
+
+        for i, col in enumerate(df.columns):
+            series = df.iloc[:, i]
+            is_missing = missing_masks[i] if missing_masks is not None else self._missing_mask(series)
+
+            # 第一个非缺失值的位置，无需筛出整列非空值
+            first = int(np.argmin(is_missing)) if len(is_missing) else 0
+            if len(is_missing) == 0 or is_missing[first]:
                 dtypes[col] = 'unknown'
                 continue
 
-            # 取样本值
-            sample = str(non_empty.iloc[0])
-
-            # 判断类型
-            if NUMERIC_PATTERN.match(sample):
-                dtypes[col] = 'numeric'
-            elif DATE_PATTERN.match(sample):
-                dtypes[col] = 'date'
-            else:
-                dtypes[col] = 'text'
+            # 取样本值判断类型
+            dtypes[col] = self._sample_type(str(series.iloc[first]))
 
         return dtypes
 
+    @staticmethod
+    def _highlight_masks(series1: pd.Series, series2: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按行位置比较两列，返回 (changed, down) 布尔数组（长度与 series2 相同）
+
+        changed: series2 有值且与 series1 不同（series1 缺失也算变化）
+        down: 变化方向为下降；两边都能转为数值时按数值比较，否则按字符串比较
+        """
+        n = len(series2)
+        a = series1.to_numpy(dtype=object)[:n]
+        if len(a) < n:
+            a = np.concatenate([a, np.full(n - len(a), np.nan, dtype=object)])
+        b = series2.to_numpy(dtype=object)
+
+        na1 = pd.isna(a)
+        na2 = pd.isna(b)
+        both = ~(na1 | na2)
+        not_equal = np.not_equal(a, b, where=both, out=np.zeros(n, dtype=bool))
+        changed = ~na2 & (na1 | not_equal)
+
+        def _to_float(values: np.ndarray, missing: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            """转为浮点数组，并标记无法转换的非缺失单元格（'nan' 文本视为可转换）"""
+            nums = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+            failed = ~missing & np.isnan(nums)
+            idx = np.flatnonzero(failed)
+            if len(idx):
+                text = pd.Series(values[idx]).astype(str).str.strip().str.lower()
+                failed[idx[text.isin(NAN_TEXT).to_numpy()]] = False
+            return nums, failed
+
+        num1, failed1 = _to_float(a, na1)
+        num2, failed2 = _to_float(b, na2)
+        non_numeric = failed1 | failed2
+        down = ~non_numeric & (num2 <= num1)
+
+        # 非数值单元格仅在发生变化的位置上按字符串比较（对象数组逐元素比较，一次完成）
+        idx = np.flatnonzero(changed & non_numeric & ~na1)
+        if len(idx):
+            text_a = np.array([str(v) for v in a[idx]], dtype=object)
+            text_b = np.array([str(v) for v in b[idx]], dtype=object)
+            down[idx] = text_b <= text_a
+
+        return changed, down
+
     def diff_highlight(self,df1: pd.DataFrame, df2: pd.DataFrame, mapping: list[dict]) -> None:
         for m in mapping:
             suffix1 = m.get('suffix1', '')
@@ -328,45 +694,19 @@ class CSVProcessor:
             df2_block.insert(0, 'Source', label2)
 
             combined = pd.concat([df1_block, df2_block], ignore_index=True)
-            combined.to_excel(out_file, index=False)
-
-            wb = load_workbook(out_file)
-            ws = wb.active
-
-            fill_up = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-            fill_down = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
 
             common_cols = [col for col in df1.columns if col in df2.columns]
-            start_row_df2 = len(df1) + 2  # Excel 行号，从第二行开始写数据
+            start_row_df2 = len(df1)  # combined 中 df2 数据的起始行位置
 
+            highlights: list[tuple[int, int, bool]] = []
             for col in common_cols:
-                col_idx = all_cols.index(col) + 2  # 加 2 是因为 Excel 从 1 开始且前一列是 Source
-                for i in range(len(df2)):
-                    row_idx = start_row_df2 + i
-
-                    if i < len(df1):
-                        val1 = df1.iloc[i][col]
-                    else:
-                        val1 = np.nan
-
-                    val2 = df2.iloc[i][col]
+                col_pos = all_cols.index(col) + 1  # 加 1 是因为前一列是 Source
+                changed, down = self._highlight_masks(df1[col], df2[col])
+                rows = np.flatnonzero(changed)
+                highlights.extend(zip((rows + start_row_df2).tolist(), [col_pos] * len(rows),
+                                      down[rows].tolist()))
 
-                    if pd.notna(val2) and (pd.isna(val1) or val1 != val2):
-                        cell = ws.cell(row=row_idx, column=col_idx)
-
-                        fill = fill_up
-                        try:
-                            num1 = float(val1)
-                            num2 = float(val2)
-                            if not np.isnan(num1) and not np.isnan(num2) and num2 <= num1:
-                                fill = fill_down
-                        except (TypeError, ValueError):
-                            if pd.notna(val1) and str(val2) <= str(val1):
-                                fill = fill_down
-
-                        cell.fill = fill
-
-            wb.save(out_file)
+            self._write_workbook(out_file, [('Sheet1', combined)], {'Sheet1': highlights})
 
     def write_diff_report(self,df1: pd.DataFrame, df2: pd.DataFrame, mapping: list[dict]) -> None:
         for m in mapping:
@@ -374,15 +714,8 @@ class CSVProcessor:
             sheet_suffix2 = m.get('sheet_suffix2', '_2')
             out_file = m.get('out_file', '')
 
-            with pd.ExcelWriter(out_file, engine="openpyxl") as writer:
-                df1.to_excel(writer, sheet_name=f"DataFrame_{sheet_suffix1}", index=False)
-                df2.to_excel(writer, sheet_name=f"DataFrame_{sheet_suffix2}", index=False)
-
-            wb = load_workbook(out_file)
-            ws2 = wb[f"DataFrame_{sheet_suffix2}"]
-
-            fill_up = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-            fill_down = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
+            sheet1 = f"DataFrame_{sheet_suffix1}"
+            sheet2 = f"DataFrame_{sheet_suffix2}"
 
             diffs = []
             selected_columns = m.get('columns') or []
@@ -403,35 +736,140 @@ class CSVProcessor:
             if not target_cols:
                 raise ValueError('no comparable columns available for diff report')
 
+            highlights: list[tuple[int, int, bool]] = []
+            n_rows = len(df1)
             for col in target_cols:
-                col_idx = df2.columns.get_loc(col) + 1
-                for r in range(len(df1)):
-                    val1 = df1.iloc[r][col]
-                    val2 = df2.iloc[r][col]
-
-                    if pd.notna(val1) and pd.notna(val2) and val1 != val2:
-                        row_idx = r + 2
-                        if val2 > val1:
-                            ws2.cell(row=row_idx, column=col_idx).fill = fill_up
-                            change = "Up"
-                        else:
-                            ws2.cell(row=row_idx, column=col_idx).fill = fill_down
-                            change = "Down"
-
-                        diffs.append({
-                            "Row": row_idx,
-                            "Column": col,
-                            f"Old{sheet_suffix1}": val1,
-                            f"New{sheet_suffix2}": val2,
-                            "Change": change
-                        })
-
-            wb.save(out_file)
-
+                col_pos = df2.columns.get_loc(col)
+                values1 = df1[col].to_numpy()
+                values2 = df2[col].to_numpy()[:n_rows]
+
+                # 整列比较，只对发生变化的单元格做逐个处理
+                both = ~(pd.isna(values1) | pd.isna(values2))
+                changed = np.flatnonzero(both & (values1 != values2))
+                if not changed.size:
+                    continue
+
+                old_vals = values1[changed]
+                new_vals = values2[changed]
+                up = new_vals > old_vals
+                for r, val1, val2, is_up in zip(changed.tolist(), old_vals, new_vals, up):
+                    highlights.append((r, col_pos, not is_up))
+                    diffs.append({
+                        "Row": r + 2,
+                        "Column": col,
+                        f"Old{sheet_suffix1}": val1,
+                        f"New{sheet_suffix2}": val2,
+                        "Change": "Up" if is_up else "Down"
+                    })
+
+            sheets = [(sheet1, df1), (sheet2, df2)]
             if diffs:
-                df_diff = pd.DataFrame(diffs)
-                with pd.ExcelWriter(out_file, engine="openpyxl", mode="a") as writer:
-                    df_diff.to_excel(writer, sheet_name="Diff Summary", index=False)
+                sheets.append(("Diff Summary", pd.DataFrame(diffs)))
+
+            self._write_workbook(out_file, sheets, {sheet2: highlights})
+
+    def write_excel(self, out_file: str, df: pd.DataFrame, sheet_name: str = 'Sheet1') -> None:
+        """
+        将 DataFrame 写出为单个工作表的 .xlsx，按行流式写出，结果与 df.to_excel(index=False) 一致
+
+        Args:
+            out_file: 输出路径
+            df: 要写出的数据
+            sheet_name: 工作表名称
+        """
+        self._write_workbook(out_file, [(sheet_name, df)], {})
+
+    def _write_workbook(
+        self,
+        out_file: str,
+        sheets: List[Tuple[str, pd.DataFrame]],
+        highlights: Dict[str, List[Tuple[int, int, bool]]]
+    ) -> None:
+        """
+        一次性写出工作簿，并在写出时为指定单元格着色（无需重新打开文件）
+
+        Args:
+            out_file: 输出路径
+            sheets: [(sheet名称, DataFrame), ...]，按顺序写出
+            highlights: {sheet名称: [(数据行位置, 列位置, 是否下降), ...]}，位置均从 0 开始
+        """
+        if self.has_xlsxwriter:
+            # constant_memory 模式逐行写出并及时落盘，内存占用与行数无关；该模式只能按行顺序写入，
+            # 所以着色单元格在写到所在行时直接带格式写出
+            # 文本不自动转为超链接、日期时间格式与 pandas 一致，使两种写出方式结果相同
+            wb = xlsxwriter.Workbook(out_file, {'constant_memory': True, 'strings_to_urls': False,
+                                                'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+            try:
+                fmt_up = wb.add_format({'bg_color': f'#{FILL_UP_COLOR}', 'pattern': 1})
+                fmt_down = wb.add_format({'bg_color': f'#{FILL_DOWN_COLOR}', 'pattern': 1})
+                # 与 pandas 默认表头样式一致：加粗、细边框、居中
+                header_fmt = wb.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+                for name, df in sheets:
+                    ws = wb.add_worksheet(name)
+                    for j, col in enumerate(df.columns):
+                        ws.write(0, j, col.item() if isinstance(col, np.generic) else col, header_fmt)
+
+                    row_fills: Dict[int, Dict[int, object]] = {}
+                    for row, col, is_down in highlights.get(name, ()):
+                        row_fills.setdefault(row, {})[col] = fmt_down if is_down else fmt_up
+                    columns = [df.iloc[:, j].to_numpy(dtype=object) for j in range(df.shape[1])]
+                    nulls = [pd.isna(values) for values in columns]
+                    for i in range(len(df)):
+                        fills = row_fills.get(i, {})
+                        # 表头占第 0 行，数据从第 1 行开始；缺失值与 pandas 一样不写单元格
+                        for j, values in enumerate(columns):
+                            if nulls[j][i]:
+                                continue
+                            value = values[i]
+                            if isinstance(value, np.generic):
+                                value = value.item()
+                            if isinstance(value, float) and np.isinf(value):
+                                value = 'inf' if value > 0 else '-inf'
+                            ws.write(i + 1, j, value, fills.get(j))
+            finally:
+                wb.close()
+            return
+
+        fill_up = PatternFill(start_color=FILL_UP_COLOR, end_color=FILL_UP_COLOR, fill_type="solid")
+        fill_down = PatternFill(start_color=FILL_DOWN_COLOR, end_color=FILL_DOWN_COLOR, fill_type="solid")
+        # 与 pandas 默认表头样式一致：加粗、细边框、居中
+        thin = Side(style="thin")
+        header_font = Font(bold=True)
+        header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        header_alignment = Alignment(horizontal="center", vertical="top")
+
+        # write_only 模式逐行流式写出，着色在创建单元格时完成，不在内存中保留整张表的单元格对象
+        wb = Workbook(write_only=True)
+        for name, df in sheets:
+            ws = wb.create_sheet(title=name)
+
+            header = []
+            for col in df.columns:
+                cell = WriteOnlyCell(ws, value=col.item() if isinstance(col, np.generic) else col)
+                cell.font = header_font
+                cell.border = header_border
+                cell.alignment = header_alignment
+                header.append(cell)
+            ws.append(header)
+
+            fills = {(row, col): fill_down if is_down else fill_up
+                     for row, col, is_down in highlights.get(name, ())}
+            columns = [df.iloc[:, j].to_numpy(dtype=object) for j in range(df.shape[1])]
+            nulls = [pd.isna(values) for values in columns]
+            for i in range(len(df)):
+                cells = []
+                for j, values in enumerate(columns):
+                    value = None if nulls[j][i] else values[i]
+                    if isinstance(value, np.generic):
+                        value = value.item()
+                    fill = fills.get((i, j))
+                    if fill is not None:
+                        value = WriteOnlyCell(ws, value=value)
+                        value.fill = fill
+                    cells.append(value)
+                ws.append(cells)
+
+        wb.save(out_file)
 
 
 # 全局处理器实例
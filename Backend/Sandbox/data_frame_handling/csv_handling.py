@@ -1,36 +1,69 @@
 from io import BytesIO
 import pandas as pd
-from functools import reduce
+from functools import reduce, lru_cache
+from collections import OrderedDict
+import hashlib
 import numpy as np
+import codecs
 import csv
 import re
 from typing import Any, Dict
 
+# PyArrow 可选：多线程 CSV 解析，未安装时回退到 pandas
+_USE_PYARROW = False
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+    _USE_PYARROW = True
+except ImportError:
+    pass
+
+
+# 分隔符检测只看文件开头这么多字节
+SNIFF_BYTES = 16384
+
+# pyarrow 解析时按 pandas read_csv 的默认规则识别缺失值与布尔值
+CSV_NULL_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+                   '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+CSV_TRUE_VALUES = ['True', 'TRUE', 'true']
+CSV_FALSE_VALUES = ['False', 'FALSE', 'false']
+
 
 def detect_separator(binary: bytes, encodings=('utf-8', 'utf-8-sig', 'latin1', 'gbk')):
     """
     自动检测 CSV 文件的分隔符和编码
     - 默认尝试多种常见编码
     - 支持常见分隔符：逗号、分号、制表符、竖线
+    - 只解码文件前 SNIFF_BYTES 字节，结果按该前缀缓存（preview → summary → clean 复用）
     """
+    return _detect_separator_cached(bytes(binary[:SNIFF_BYTES]), tuple(encodings))
+
+
+@lru_cache(maxsize=256)
+def _detect_separator_cached(prefix: bytes, encodings: tuple):
     for enc in encodings:
         try:
-            text = binary.decode(enc)
+            # 增量解码：前缀末尾被截断的多字节字符不会导致解码失败
+            text = codecs.getincrementaldecoder(enc)().decode(prefix, final=False)
             sample = text[:10000]  # 取前一段文本作为样本
             # 用 Sniffer 猜分隔符
             dialect = csv.Sniffer().sniff(sample, delimiters=[',', ';', '\t', '|'])
-            print(f"[DEBUG] 检测到分隔符: {repr(dialect.delimiter)}, 编码: {enc}")
             return dialect.delimiter, enc
         except Exception:
             continue
 
     # 如果都失败，默认逗号 + utf-8
-    print("[DEBUG] 自动检测失败，使用默认分隔符 ',' 和编码 'utf-8'")
     return ',', 'utf-8'
 
+# 已解析 DataFrame 的缓存：blake2b(文件内容) -> DataFrame，按 LRU 淘汰
+DF_CACHE_SIZE = 16
+_DF_CACHE: "OrderedDict[bytes, pd.DataFrame]" = OrderedDict()
+
+
 def _to_df(binary: bytes, encoding: str = 'utf-8') -> pd.DataFrame:
     """
     将二进制 CSV 读成 DataFrame。
+    同一份文件（preview → summary → clean）只解析一次，之后返回缓存结果的副本。
 
     Args:
         binary: CSV 文件的二进制数据
@@ -39,14 +72,90 @@ def _to_df(binary: bytes, encoding: str = 'utf-8') -> pd.DataFrame:
     Returns:
         pd.DataFrame: 解析后的数据框
     """
+    key = hashlib.blake2b(binary, digest_size=16).digest()
+    df = _DF_CACHE.get(key)
+    if df is None:
+        df = _parse_csv(binary)
+        _DF_CACHE[key] = df
+        if len(_DF_CACHE) > DF_CACHE_SIZE:
+            _DF_CACHE.popitem(last=False)
+    else:
+        _DF_CACHE.move_to_end(key)
+    # 返回副本，调用方修改列名/单元格不会污染缓存
+    return df.copy()
+
+
+def invalidate_cache(binary: bytes | None = None) -> None:
+    """清除某个文件的解析缓存；不传参数时清空全部缓存"""
+    if binary is None:
+        _DF_CACHE.clear()
+        return
+    _DF_CACHE.pop(hashlib.blake2b(binary, digest_size=16).digest(), None)
+
+
+def _parse_csv(binary: bytes) -> pd.DataFrame:
+    """检测分隔符/编码并解析 CSV（不走缓存）"""
     # 你也可以在 read_csv 里加参数，如 sep=';', encoding='utf-8', dtype=str 等
     sep, encoding = detect_separator(binary)
-    bio = BytesIO(binary)
-    df = pd.read_csv(bio, sep=sep, encoding=encoding)
+    df = _parse_csv_arrow(binary, sep, encoding) if _USE_PYARROW else None
+    if df is None:
+        bio = BytesIO(binary)
+        df = pd.read_csv(bio, sep=sep, encoding=encoding)
     df.attrs["sep"] = sep
     df.attrs["encoding"] = encoding
     return df
 
+def _arrow_convert_options(column_types=None) -> "pacsv.ConvertOptions":
+    """pyarrow 的类型转换选项（缺失值、布尔值的识别与 pandas 默认一致）"""
+    return pacsv.ConvertOptions(null_values=CSV_NULL_VALUES, true_values=CSV_TRUE_VALUES,
+                                false_values=CSV_FALSE_VALUES, strings_can_be_null=True,
+                                column_types=column_types)
+
+
+def _parse_csv_arrow(binary: bytes, sep: str, encoding: str):
+    """
+    用 pyarrow 解析 CSV，列类型与 pd.read_csv 保持一致：
+    日期/时间类列按原始文本读取（pandas 不会自动解析日期），整列为空的列为 float64，
+    空列名、重复列名按 pandas 的规则改名；无法解析时返回 None，由调用方回退到 pandas
+    """
+    read_options = pacsv.ReadOptions(encoding=encoding)
+    parse_options = pacsv.ParseOptions(delimiter=sep)
+    try:
+        # 先按首个数据块推断列类型，日期时间列改为按字符串读取
+        schema = pacsv.open_csv(BytesIO(binary), read_options=read_options, parse_options=parse_options,
+                                convert_options=_arrow_convert_options()).schema
+        temporal = {f.name: pa.string() for f in schema if pa.types.is_temporal(f.type)}
+        table = pacsv.read_csv(BytesIO(binary), read_options=read_options, parse_options=parse_options,
+                               convert_options=_arrow_convert_options(temporal or None))
+        for i, field in enumerate(table.schema):
+            if pa.types.is_null(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+        table = table.rename_columns(_mangle_columns(table.column_names))
+        df = table.to_pandas()
+        # 字符串列的缺失值转出为 None，统一为 NaN，与 pd.read_csv 一致（转字符串后同样是 'nan'）
+        obj_cols = df.columns[df.dtypes == object]
+        if len(obj_cols):
+            df[obj_cols] = df[obj_cols].where(df[obj_cols].notna(), np.nan)
+        return df
+    except (pa.ArrowException, UnicodeDecodeError, LookupError):
+        return None
+
+
+def _mangle_columns(names: list) -> list:
+    """与 pandas read_csv 一致：空列名改为 Unnamed: i，重复列名依次加 .1/.2"""
+    result = []
+    seen: Dict[str, int] = {}
+    for i, name in enumerate(names):
+        name = name or f"Unnamed: {i}"
+        base = name
+        while name in seen:
+            seen[base] += 1
+            name = f"{base}.{seen[base]}"
+        seen[name] = 0
+        result.append(name)
+    return result
+
+
 def read_csv_preview(binary: bytes, n: int = 5, encoding: str = 'utf-8') -> Dict:
     """
     返回前 n 行的预览记录与列名。
@@ -125,43 +234,43 @@ def clean_csv(binary: bytes,
     if flatten_header and isinstance(df.columns, pd.MultiIndex):
         df.columns = ["_".join([str(x) for x in col if x]) for col in df.columns.values]
 
-    # 列名处理
-    new_cols = []
-    seen = {}
-    for c in df.columns:
-        name = str(c).strip()
-
-        # 统一大小写， {'upper', 'lower', 'title', None}, 默认upper
-        if case == "upper":
-            name = name.upper()
-        elif case == "lower":
-            name = name.lower()
-        elif case == "title":
-            name = name.title()
-
-        # 去除特殊符号
-        if strip_special:
-            import re
-            name = re.sub(r"[^0-9a-zA-Z_\u4e00-\u9fff]+", "_", name).strip("_")
-
-        # 加前缀
-        if prefix:
-            name = f"{prefix}{name}"
-
-        # 列名去重
-        if dedupe_columns:
-            count = seen.get(name, 0)
-            if count > 0:
-                name = f"{name}_{count}"
-            seen[name] = count + 1
-        new_cols.append(name)
-    df.columns = new_cols
+    # 列名处理（整列向量化）
+    names = pd.Index([str(c) for c in df.columns], dtype=object).str.strip()
+
+    # 统一大小写， {'upper', 'lower', 'title', None}, 默认upper
+    if case == "upper":
+        names = names.str.upper()
+    elif case == "lower":
+        names = names.str.lower()
+    elif case == "title":
+        names = names.str.title()
+
+    # 去除特殊符号
+    if strip_special:
+        names = names.str.replace(r"[^0-9a-zA-Z_\u4e00-\u9fff]+", "_", regex=True).str.strip("_")
+
+    # 加前缀
+    if prefix:
+        names = prefix + names
+
+    # 列名去重：同名列按出现顺序编号，第一次出现保留原名，其后依次加 _1, _2
+    if dedupe_columns:
+        counts = names.to_series().groupby(names).cumcount().to_numpy()
+        names = np.where(counts == 0, names, names + "_" + counts.astype(str))
+
+    df.columns = list(names)
 
     # 去除单元格首尾空格
     if strip_cell_space:
         obj_cols = df.select_dtypes(include=["object"]).columns
         for col in obj_cols:
-            df[col] = df[col].apply(lambda x: x.strip() if isinstance(x, str) else x)
+            series = df[col]
+            try:
+                stripped = series.str.strip()
+            except AttributeError:
+                continue  # 该列没有字符串值
+            # .str 对非字符串返回 NaN，这些位置保留原值
+            df[col] = stripped.where(stripped.notna(), series)
 
     # 数据行去重
     df = df.drop_duplicates(subset=subset, keep=keep).reset_index(drop=True)
@@ -177,19 +286,21 @@ def normalize_dates(df, date_cols=None, date_format="%Y-%m-%d"):
     df = df.copy()
 
     for col in (date_cols if date_cols else df.columns):
-        def convert(x):
-            if pd.isna(x):
-                return x
-            try:
-                return pd.to_datetime(x, errors="raise").strftime(date_format)
-            except Exception:
-                return x  # 保留原值
-
-        df[col] = df[col].apply(convert)
+        df[col] = df[col].apply(_format_date, args=(date_format,))
 
     return df
 
 
+def _format_date(x, date_format: str):
+    """单个值转为指定日期格式，无法解析时保留原值"""
+    if pd.isna(x):
+        return x
+    try:
+        return pd.to_datetime(x, errors="raise").strftime(date_format)
+    except Exception:
+        return x  # 保留原值
+
+
 def normalize_units(df:pd.DataFrame, unit_map:dict[str:int], base_units):
     """
     单位换算
@@ -474,7 +585,8 @@ def combine_dfs(dfs: list[pd.DataFrame],
     if method == "concat":
         normed = []
         for df in dfs:
-            df = df.copy()
+            # 浅拷贝：只复制轴信息，不复制数据块（重命名列不会影响调用方的 DataFrame）
+            df = df.copy(deep=False)
             if alias:
                 df.rename(columns=alias, inplace=True)
             if uppercase_cols:
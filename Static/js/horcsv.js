@@ -219,9 +219,9 @@
     const tbody = document.createElement('tbody');
     (rows || []).forEach((row) => {
       const tr = document.createElement('tr');
-      cols.forEach((col) => {
+      cols.forEach((col, idx) => {
         const td = document.createElement('td');
-        let value = row[col];
+        let value = row[idx];
         if (value === null || value === undefined) {
           value = '';
         }
@@ -1173,44 +1173,32 @@
         fd.append('sep2', sep2);
       }
 
-      const payloadEntries = Array.from(fd.entries());
-      const sendRequest = async (url) => {
-        const body = new FormData();
-        payloadEntries.forEach(([key, value]) => body.append(key, value));
-        const resp = await fetch(url, {
-          method: 'POST',
-          body
-        });
-        const data = await parseJsonResponse(resp);
-        return { resp, data };
-      };
-
       setDiffStatus('生成差异中，请稍候...', 'info');
       if (btnDiffHighlight) btnDiffHighlight.disabled = true;
       if (btnDiffReport) btnDiffReport.disabled = true;
 
-      let { resp, data } = await sendRequest(endpoint);
-
-      const fallbackEndpoint = endpoint.includes('-')
-        ? endpoint.replace(/-/g, '_')
-        : endpoint;
-
-      const needsFallback =
-        resp.status === 404 &&
-        fallbackEndpoint !== endpoint &&
-        (!data?.ok) &&
-        (!data?.error || /not\s+found/i.test(data.error));
-
-      if (needsFallback) {
-        console.warn(`API route ${endpoint} missing, retrying as ${fallbackEndpoint}`);
-        ({ resp, data } = await sendRequest(fallbackEndpoint));
-      }
+      const resp = await fetch(endpoint, {
+        method: 'POST',
+        body: fd
+      });
+      const data = await parseJsonResponse(resp);
 
       if (!resp.ok || !data?.ok) {
         const message = data?.error || `HTTP ${resp.status}`;
         throw new Error(message);
       }
 
+      // 输出文件在后台生成，轮询任务状态直到完成
+      while (data.job_id && data.status === 'pending') {
+        await new Promise((resolve) => setTimeout(resolve, 500));
+        const statusResp = await fetch(`/api/csv/diff_status/${data.job_id}`);
+        const status = await parseJsonResponse(statusResp);
+        if (!statusResp.ok || !status?.ok) {
+          throw new Error(status?.error || `HTTP ${statusResp.status}`);
+        }
+        data.status = status.status;
+      }
+
       const files = data.created_files || [];
       const urls = data.download_urls || [];
       setDiffStatus(`生成成功：${files.length} 个输出文件`, 'success');
@@ -1224,8 +1212,8 @@
     }
   }
 
-  btnDiffHighlight?.addEventListener('click', () => handleDiffRequest('/api/csv/diff-highlight'));
-  btnDiffReport?.addEventListener('click', () => handleDiffRequest('/api/csv/diff-report'));
+  btnDiffHighlight?.addEventListener('click', () => handleDiffRequest('/api/csv/diff_highlight'));
+  btnDiffReport?.addEventListener('click', () => handleDiffRequest('/api/csv/diff_report'));
 
   console.log('✅ CSV 工作区已初始化');
 })();
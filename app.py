@@ -5,14 +5,16 @@ CSV/Excel 数据分析与金融建模 Web 应用
 """
 
 import os
-from flask import Flask, render_template, session, redirect, url_for, g, request
+from tempfile import SpooledTemporaryFile
+from flask import Flask, Request, render_template, session, redirect, url_for, g, request
 from functools import wraps
 
 # 导入 Blueprint
-from Backend.Controller.csvcontroller import bp as csv_bp
+from Backend.Controller.csvcontroller import bp as csv_bp, MAX_BYTES, MULTIPART_OVERHEAD
 from Backend.Controller.auth_controller import auth_bp
 from Backend.Controller.notes_controller import notes_bp
 from Backend.Controller.memos_controller import memos_bp
+from Backend.Controller.json_utils import OrjsonProvider
 
 # 配置路径
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -31,13 +33,29 @@ print(f"Static Directory: {STATIC_DIR} (exists: {os.path.exists(STATIC_DIR)})")
 print(f"Upload Directory: {UPLOAD_DIR} (exists: {os.path.exists(UPLOAD_DIR)})")
 print("=" * 60)
 
+# 上传文件在该大小以内时留在内存中，超过后才写入临时文件
+UPLOAD_SPOOL_BYTES = 8 * 1024 * 1024  # 8MB
+
+
+class SpooledUploadRequest(Request):
+    """放大上传文件的内存缓冲（Werkzeug 默认超过 500KB 就写入磁盘临时文件）"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES, mode='rb+')
+
+
 # 创建 Flask 应用
 app = Flask(__name__, template_folder=TEMPLATE_DIR, static_folder=STATIC_DIR)
+app.request_class = SpooledUploadRequest
+app.json = OrjsonProvider(app)
 
 # 应用配置
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB
+# 上限与 CSV 接口的单文件上限一致（加上 multipart 的余量），Werkzeug 在读取请求体前即按 Content-Length 拒绝
+app.config['MAX_CONTENT_LENGTH'] = MAX_BYTES + MULTIPART_OVERHEAD
 app.config['UPLOAD_FOLDER'] = UPLOAD_DIR
 app.config['SECRET_KEY'] = 'horisation-secret-key-2024'  # 会话密钥
+# 部署在支持 X-Sendfile 的反向代理之后时设置 HORISATION_X_SENDFILE=1，下载文件由代理直接发送
+app.config['USE_X_SENDFILE'] = os.environ.get('HORISATION_X_SENDFILE') == '1'
 
 # 注册 Blueprint
 app.register_blueprint(csv_bp)
@@ -190,4 +208,5 @@ if __name__ == '__main__':
     print("CSV Workspace: http://localhost:5000/csv")
     print("=" * 60 + "\n")
 
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # 每个请求一个线程：上传接收、落盘期间不阻塞其他请求（解析本身在 pandas C 代码中释放 GIL）
+    app.run(debug=True, host='0.0.0.0', port=5001, threaded=True)